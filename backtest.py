@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline backtest / parameter sweep for the ZigZag pattern watcher
+- อ่านข้อมูลย้อนหลังจากไฟล์ในเครื่อง (<SYMBOL>_<TF>.csv / .parquet / .npy) ไม่ต้องเปิด MT5
+- รัน zigzag → HH/HL/LH/LL → pattern matcher แบบเดียวกับตอน live
+- สรุปจำนวนครั้งที่เจอแต่ละแพทเทิร์น และการเคลื่อนไหวของราคาหลังจากนั้น
+- โหมด sweep: ลองหลายชุด depth/deviation/backstep พร้อมกันด้วย process pool
+"""
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.backtest.data import FileRatesSource
+from core.backtest.engine import param_grid, sweep
+from core.config.config import load_config
+from core.zigzag.calculator import ZigZagParams
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Offline ZigZag pattern backtest")
+    parser.add_argument("--config", required=True, help="Path to config.yaml or config.json")
+    parser.add_argument("--data", required=True, help="Directory with <SYMBOL>_<TF>.csv/.parquet/.npy files")
+    parser.add_argument("--depth", help="Comma separated depths to sweep (default: each watch's)")
+    parser.add_argument("--deviation", help="Comma separated deviations in points (default: each watch's)")
+    parser.add_argument("--backstep", help="Comma separated backsteps (default: each watch's)")
+    parser.add_argument("--point", help="Point size per symbol, e.g. EURUSD=0.00001,XAUUSD=0.01; a bare "
+                                        "number applies to the rest (default: recorded next to the history)")
+    parser.add_argument("--horizon", type=int, default=20, help="Bars for the forward move statistic")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    return parser.parse_args()
+
+
+def _values(arg: str, cast, default) -> List:
+    return [cast(x) for x in arg.split(",")] if arg else [default]
+
+
+def _points(arg: Optional[str]) -> Tuple[Optional[float], Dict[str, float]]:
+    """``--point``: (default for unlisted symbols, per-symbol points)."""
+    default, points = None, {}
+    for item in (arg.split(",") if arg else []):
+        if "=" in item:
+            symbol, value = item.split("=", 1)
+            points[symbol.strip()] = float(value)
+        else:
+            default = float(item)
+    return default, points
+
+
+def main() -> None:
+    """Main function to run the backtest."""
+    args = parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(message)s",
+    )
+    cfg = load_config(args.config)
+    source = FileRatesSource(args.data)
+
+    default_point, points = _points(args.point)
+
+    # One dataset per (file, point, patterns); watches on it add their params to its grid
+    grids: Dict[Tuple[str, str, str, float, str], Set[ZigZagParams]] = {}
+    for w in cfg.watches:
+        path = source.path_for(w.symbol, w.timeframe)
+        if path is None:
+            logging.warning("No history file for %s %s in %s, skipped", w.symbol, w.timeframe, args.data)
+            continue
+        point = points.get(w.symbol) or source.point_for(w.symbol) or default_point
+        if point is None:
+            logging.error("Point of %s unknown (not recorded with its history), pass --point %s=<point>; skipped",
+                          w.symbol, w.symbol)
+            continue
+        grid = param_grid(
+            _values(args.depth, int, w.zz_depth),
+            _values(args.deviation, float, w.zz_deviation_points),
+            _values(args.backstep, int, w.zz_backstep),
+        )
+        grids.setdefault((path, w.symbol, w.timeframe, point, json.dumps(w.patterns)), set()).update(grid)
+    datasets = [(path, symbol, timeframe, point, sorted(grid), json.loads(patterns))
+                for (path, symbol, timeframe, point, patterns), grid in sorted(grids.items())]
+    logging.info("Backtesting %d dataset(s), %d run(s)", len(datasets), sum(len(d[4]) for d in datasets))
+
+    t0 = time.perf_counter()
+    results = sweep(datasets, horizon=args.horizon, workers=args.workers)
+    logging.info("Done %d runs in %.1fs", len(results), time.perf_counter() - t0)
+
+    for r in sorted(results, key=lambda r: r["hits_total"], reverse=True)[:10]:
+        logging.info("%s %s depth=%d dev=%s backstep=%d → %d hits over %d pivots",
+                     r["symbol"], r["timeframe"], r["depth"], r["deviation"], r["backstep"],
+                     r["hits_total"], r["pivots"])
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        logging.info("Results written to %s", args.out)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark ของ hot path: zigzag → HH/HL/LH/LL → pattern match → payload
+- ใช้ข้อมูลสังเคราะห์ (random walk) ไม่ต้องเปิด MT5
+- process_once รันบน simulator (core/mt5/simulator.py) ทีละแท่งใหม่
+- ผลลัพธ์เป็น JSON เก็บไว้เทียบระหว่างเวอร์ชัน; --compare จะ exit 1 ถ้าช้าลงเกิน --threshold
+
+ตัวอย่าง:
+    python benchmark.py --out bench.json
+    python benchmark.py --sizes 1000,10000 --compare bench.json
+    python benchmark.py --sizes 1000,10000,100000,1000000 --out bench_large.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from core.config.config import AppConfig, WatchConfig
+from core.mt5.connection import set_data_source, timeframe_to_mt5
+from core.mt5.history import RATES_DTYPE
+from core.mt5.source import create_source
+from core.orchestrator import process_once
+from core.patterns.detector import PatternBuffer, classify_pivots_hhhl, compile_patterns
+from core.webhook.sender import build_payload
+from core.zigzag.calculator import IncrementalZigZag, zigzag_classic, zigzag_multi, zigzag_numpy
+
+LABELS = ("HH", "HL", "LH", "LL")
+POINT = 0.0001
+DEVIATION = 5.0
+BACKSTEP = 3
+
+
+def synthetic_rates(n: int, seed: int = 0) -> np.ndarray:
+    """Random-walk M1 bars as an MT5 rates record array."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, 0.0005, size=(3, n))
+    close = 1.1 + np.cumsum(steps[0])
+    opens = np.concatenate([[1.1], close[:-1]])
+    rates = np.zeros(n, dtype=RATES_DTYPE)
+    rates["time"] = 1_700_000_000 + 60 * np.arange(n)
+    rates["open"] = opens
+    rates["close"] = close
+    rates["high"] = np.maximum(opens, close) + np.abs(steps[1]) * 0.5
+    rates["low"] = np.minimum(opens, close) - np.abs(steps[2]) * 0.5
+    return rates
+
+
+def random_patterns(count: int, seed: int = 0) -> List[List[str]]:
+    rng = np.random.default_rng(seed)
+    return [[LABELS[k] for k in rng.integers(0, 4, size=rng.integers(3, 7))] for _ in range(count)]
+
+
+def measure(fn: Callable[[], Any], min_time: float, max_repeat: int = 1000) -> Dict[str, Any]:
+    """Call ``fn`` until ``min_time`` seconds are spent (at least twice); seconds per call."""
+    fn()  # warm-up
+    samples: List[float] = []
+    spent = 0.0
+    while (spent < min_time or len(samples) < 2) and len(samples) < max_repeat:
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        samples.append(dt)
+        spent += dt
+    return {
+        "repeat": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+    }
+
+
+def bench_zigzag(rates: np.ndarray, depth: int, min_time: float) -> List[Dict[str, Any]]:
+    df = pd.DataFrame(rates)
+    df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+    highs, lows, times = df["high"], df["low"], df["time"]
+
+    def incremental() -> None:
+        zz = IncrementalZigZag(depth, DEVIATION, BACKSTEP, POINT)
+        zz.feed(highs, lows, times)
+
+    cases = {
+        "zigzag_classic": lambda: zigzag_classic(highs, lows, times, depth, DEVIATION, BACKSTEP, POINT),
+        "zigzag_numpy": lambda: zigzag_numpy(rates, depth, DEVIATION, BACKSTEP, POINT),
+        "zigzag_incremental_feed": incremental,
+    }
+    return [dict(name=name, params={"bars": len(rates), "depth": depth}, **measure(fn, min_time))
+            for name, fn in cases.items()]
+
+
+def bench_zigzag_multi(rates: np.ndarray, depths: List[int], min_time: float) -> List[Dict[str, Any]]:
+    """Every depth x 3 deviations: separate zigzag_numpy calls vs one zigzag_multi pass."""
+    params = [(d, v, BACKSTEP) for d in depths for v in (DEVIATION / 2, DEVIATION, DEVIATION * 4)]
+    info = {"bars": len(rates), "depths": depths, "sets": len(params)}
+    return [
+        dict(name="zigzag_numpy_each", params=info,
+             **measure(lambda: [zigzag_numpy(rates, d, v, b, POINT) for d, v, b in params], min_time)),
+        dict(name="zigzag_multi", params=info, **measure(lambda: zigzag_multi(rates, params, POINT), min_time)),
+    ]
+
+
+def bench_patterns(rates: np.ndarray, depth: int, counts: List[int], min_time: float,
+                   ends_with_pivots: int = 20000) -> List[Dict[str, Any]]:
+    pivots = zigzag_numpy(rates, depth, DEVIATION, BACKSTEP, POINT).to_pivots()
+    results = [dict(name="classify_pivots_hhhl", params={"bars": len(rates), "pivots": len(pivots)},
+                    **measure(lambda: classify_pivots_hhhl(pivots), min_time))]
+    labels = classify_pivots_hhhl(pivots)
+    # The naive scan is O(pivots * patterns); only its newest pivots are timed
+    ends_labels = labels[-ends_with_pivots:] if ends_with_pivots > 0 else labels
+    for count in counts:
+        patterns = random_patterns(count)
+        params = {"pivots": len(labels), "patterns": count}
+
+        def ends_with() -> None:
+            buf = PatternBuffer(maxlen=10)
+            for lab in ends_labels:
+                buf.extend([lab])
+                for p in patterns:
+                    buf.ends_with(p)
+
+        matcher = compile_patterns(patterns)
+
+        def advance() -> None:
+            m = matcher.clone()
+            for lab in labels:
+                m.advance(lab)
+
+        results.append(dict(name="PatternBuffer.ends_with", params=dict(params, pivots=len(ends_labels)),
+                            **measure(ends_with, min_time)))
+        results.append(dict(name="matcher.advance", params=params, **measure(advance, min_time)))
+
+    labels_tail = labels[-5:]
+    results.append(dict(
+        name="build_payload", params={"pivots": len(pivots)},
+        **measure(lambda: build_payload("EURUSD", "M1", labels_tail, labels[-10:], pivots, 1.1), min_time),
+    ))
+    return results
+
+
+class _NullDispatcher:
+    """Counts alerts instead of sending them."""
+
+    def __init__(self) -> None:
+        self.published = 0
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        self.published += 1
+        return 1
+
+
+def bench_process_once(bars: int, depth: int, patterns: int, backend: str, cycles: int) -> List[Dict[str, Any]]:
+    """
+    Steady-state ``process_once`` cycles on the simulator: one new M1 bar per
+    cycle, then the same number of cycles with no new bar.
+    """
+    source = create_source("simulator", symbols=["SIM000"], speed=0, start=1_700_000_000,
+                           history_bars=bars)
+    set_data_source(source)
+    source.initialize()
+    watch = WatchConfig(symbol="SIM000", timeframe="M1", bars_to_fetch=bars, zz_depth=depth,
+                        zz_deviation_points=DEVIATION, zz_backstep=BACKSTEP,
+                        patterns=random_patterns(patterns), zz_backend=backend)
+    watch.matcher = compile_patterns(watch.patterns)
+    cfg = AppConfig(symbol=watch.symbol, timeframe=watch.timeframe, bars_to_fetch=bars, poll_interval_sec=1,
+                    zz_depth=depth, zz_deviation_points=DEVIATION, zz_backstep=BACKSTEP,
+                    webhook_url="", patterns=watch.patterns, watches=[watch])
+    dispatcher = _NullDispatcher()
+    state: Dict[str, Any] = {}
+    tf = timeframe_to_mt5("M1")
+
+    t0 = time.perf_counter()
+    process_once(cfg, watch, tf, state, dispatcher)
+    first = time.perf_counter() - t0
+
+    samples = []
+    for _ in range(cycles):
+        source.advance(60)
+        t0 = time.perf_counter()
+        process_once(cfg, watch, tf, state, dispatcher)
+        samples.append(time.perf_counter() - t0)
+    # Between closes: no new bar, the cycle should stop after the probe
+    idle = []
+    for _ in range(cycles):
+        t0 = time.perf_counter()
+        process_once(cfg, watch, tf, state, dispatcher)
+        idle.append(time.perf_counter() - t0)
+    set_data_source(None)
+    params = {"bars": bars, "depth": depth, "patterns": patterns, "backend": backend}
+    return [
+        dict(name="process_once", params=params, first_cycle=first, repeat=len(samples), min=min(samples),
+             median=statistics.median(samples), mean=statistics.fmean(samples), alerts=dispatcher.published),
+        dict(name="process_once_unchanged", params=params, repeat=len(idle), min=min(idle),
+             median=statistics.median(idle), mean=statistics.fmean(idle)),
+    ]
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> int:
+    """Print best-time ratios against a previous run; returns the number of regressions."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["name"], json.dumps(r["params"], sort_keys=True)))
+        if old is None:
+            continue
+        ratio = r["min"] / old["min"] if old["min"] else float("inf")
+        flag = ""
+        if ratio > 1.0 + threshold:
+            regressions += 1
+            flag = "  <-- REGRESSION"
+        logging.info("%-26s %-60s %8.3fx%s", r["name"], json.dumps(r["params"], sort_keys=True), ratio, flag)
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the zigzag pattern hot path")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma separated bar counts (add 1000000 for the large case)")
+    parser.add_argument("--depths", default="12", help="Comma separated zigzag depths")
+    parser.add_argument("--patterns", default="2,20,200", help="Comma separated pattern counts")
+    parser.add_argument("--ends-with-pivots", type=int, default=20000,
+                        help="Newest pivots timed by the naive PatternBuffer.ends_with case (0 = all)")
+    parser.add_argument("--backends", default="incremental,classic,numpy", help="process_once backends")
+    parser.add_argument("--cycle-bars", default="3000", help="bars_to_fetch for process_once cases")
+    parser.add_argument("--cycles", type=int, default=200, help="process_once cycles per case")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to spend per micro case")
+    parser.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown for --compare (0.10 = 10%%)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main function to run the benchmarks."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(message)s")
+    # process_once logs every cycle; keep that out of the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    ints = lambda s: [int(x) for x in s.split(",") if x]  # noqa: E731
+
+    results: List[Dict[str, Any]] = []
+    for n in ints(args.sizes):
+        rates = synthetic_rates(n)
+        for depth in ints(args.depths):
+            results.extend(bench_zigzag(rates, depth, args.min_time))
+            results.extend(bench_patterns(rates, depth, ints(args.patterns), args.min_time, args.ends_with_pivots))
+        if len(ints(args.depths)) > 1:
+            results.extend(bench_zigzag_multi(rates, ints(args.depths), args.min_time))
+    for bars in ints(args.cycle_bars):
+        for depth in ints(args.depths):
+            for count in ints(args.patterns):
+                for backend in args.backends.split(","):
+                    results.extend(bench_process_once(bars, depth, count, backend, args.cycles))
+
+    logging.getLogger().setLevel(logging.INFO)
+    report = {
+        "meta": {
+            "timestamp_utc": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        logging.info("Results written to %s", args.out)
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            logging.error("%d case(s) slower than baseline by more than %.0f%%", regressions, args.threshold * 100)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
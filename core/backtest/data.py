@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local OHLC history files for offline backtests.
+
+Files hold one (symbol, timeframe) each and are named ``<SYMBOL>_<TF>.<ext>``:
+    .csv      columns time, open, high, low, close[, tick_volume, spread, real_volume];
+              time as epoch seconds or an ISO date string (UTC)
+    .parquet  same columns (needs pyarrow or fastparquet)
+    .npy      MT5 rates record array as saved with ``np.save``
+
+The live watcher's on-disk history (``<root>/<SYMBOL>/<TF>/``, see
+``core.mt5.history``) is read directly as well.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.mt5.history import RATES_DTYPE, HistoryCache, HistorySeries
+
+EXTENSIONS = (".npy", ".parquet", ".csv")
+
+
+def frame_to_rates(df: pd.DataFrame) -> np.ndarray:
+    """Convert an OHLC DataFrame into an MT5-style record array."""
+    rates = np.zeros(len(df), dtype=RATES_DTYPE)
+    time = df["time"]
+    if pd.api.types.is_numeric_dtype(time):
+        rates["time"] = time.to_numpy(dtype=np.int64)
+    else:
+        rates["time"] = pd.to_datetime(time, utc=True).astype("int64") // 10**9
+    for name in RATES_DTYPE.names[1:]:
+        if name in df.columns:
+            rates[name] = df[name].to_numpy()
+    return rates
+
+
+def rates_to_frame(rates: np.ndarray) -> pd.DataFrame:
+    """Record array → DataFrame with tz-aware UTC 'time', as ``get_rates`` returns."""
+    df = pd.DataFrame(rates)
+    df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+    return df
+
+
+def load_rates_array(path: str) -> np.ndarray:
+    """Load a history file (or history cache directory) as a record array sorted by time."""
+    if os.path.isdir(path):
+        rates = HistorySeries(path).read().to_records()
+    elif path.endswith(".npy"):
+        rates = np.load(path)
+    elif path.endswith(".parquet"):
+        rates = frame_to_rates(pd.read_parquet(path))
+    elif path.endswith(".csv"):
+        rates = frame_to_rates(pd.read_csv(path))
+    else:
+        raise ValueError(f"Unsupported history file: {path} (use {', '.join(EXTENSIONS)})")
+    if len(rates) > 1 and np.any(np.diff(rates["time"]) < 0):
+        rates = np.sort(rates, order="time")
+    return rates
+
+
+class FileRatesSource:
+    """
+    Serves bars from ``<root>/<SYMBOL>_<TF>.<ext>`` (or a history cache under
+    ``root``) through the same calls as ``core.mt5.connection`` (``get_rates`` /
+    ``get_rates_array``), with the timeframe given as its string name.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._cache = {}
+
+    def path_for(self, symbol: str, timeframe: str) -> Optional[str]:
+        cached = os.path.join(self.root, symbol, timeframe.upper())
+        if os.path.exists(os.path.join(cached, "time.bin")):
+            return cached
+        for ext in EXTENSIONS:
+            path = os.path.join(self.root, f"{symbol}_{timeframe.upper()}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def point_for(self, symbol: str) -> Optional[float]:
+        """Point the live watcher recorded next to the symbol's history, None if absent."""
+        return HistoryCache(self.root).point(symbol)
+
+    def get_rates_array(self, symbol: str, timeframe: str, count: Optional[int] = None) -> np.ndarray:
+        key = (symbol, timeframe.upper())
+        if key not in self._cache:
+            path = self.path_for(symbol, timeframe)
+            if path is None:
+                raise RuntimeError(f"No history file for {symbol} {timeframe} in {self.root}")
+            self._cache[key] = load_rates_array(path)
+        rates = self._cache[key]
+        return rates if count is None else rates[-count:]
+
+    def get_rates(self, symbol: str, timeframe: str, count: Optional[int] = None) -> pd.DataFrame:
+        return rates_to_frame(self.get_rates_array(symbol, timeframe, count))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline backtest: zigzag → HH/HL/LH/LL labels → pattern matcher over history,
+plus a parameter-grid sweep fanned out over a process pool.
+"""
+
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.backtest.data import load_rates_array
+from core.patterns.detector import Matcher, PatternStream, compile_patterns
+from core.patterns.dsl import PatternSpec
+from core.zigzag.calculator import ZigZagArrays, ZigZagParams, zigzag_multi, zigzag_numpy
+
+
+def pattern_name(pattern: PatternSpec) -> str:
+    return pattern if isinstance(pattern, str) else " ".join(pattern)
+
+
+@dataclass
+class PatternStats:
+    """Hit statistics of one pattern."""
+    hits: int = 0
+    first_time: Optional[int] = None  # epoch seconds of the matched pivot
+    last_time: Optional[int] = None
+    # Close-to-close move (points) over `horizon` bars after the pivot is confirmed
+    forward_sum: float = 0.0
+    forward_up: int = 0
+    forward_count: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["forward_mean_points"] = self.forward_sum / self.forward_count if self.forward_count else None
+        d["forward_up_ratio"] = self.forward_up / self.forward_count if self.forward_count else None
+        return d
+
+
+@dataclass
+class BacktestResult:
+    """Outcome of one (history, zigzag params) run."""
+    symbol: str
+    timeframe: str
+    depth: int
+    deviation: float
+    backstep: int
+    bars: int
+    pivots: int
+    stats: Dict[str, PatternStats] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: v for k, v in asdict(self).items() if k != "stats"}
+        d["hits_total"] = sum(s.hits for s in self.stats.values())
+        d["stats"] = {name: s.to_dict() for name, s in self.stats.items()}
+        return d
+
+
+def run_backtest(
+    rates: np.ndarray,
+    patterns: Sequence[PatternSpec],
+    depth: int,
+    deviation: float,
+    backstep: int,
+    point: float,
+    horizon: int = 20,
+    symbol: str = "",
+    timeframe: str = "",
+    matcher: Optional[Matcher] = None,
+    arrays: Optional[ZigZagArrays] = None,
+) -> BacktestResult:
+    """
+    Run the live pipeline once over a rates record array (see ``core.backtest.data``)
+    and collect per-pattern hit statistics.
+
+    A pivot at bar ``i`` is only known once bar ``i + depth`` closes, so the
+    forward move is measured from that bar's close. ``arrays`` are precomputed
+    pivots for these parameters (see ``zigzag_multi``).
+    """
+    if arrays is None:
+        arrays = zigzag_numpy(rates, depth, deviation, backstep, point)
+    pivots = arrays.to_pivots()
+    stream = PatternStream(matcher or compile_patterns(patterns))
+
+    result = BacktestResult(symbol, timeframe, depth, deviation, backstep, len(rates), len(pivots))
+    for p in patterns:
+        result.stats[pattern_name(p)] = PatternStats()
+
+    close = rates["close"]
+    times = rates["time"]
+    n = len(rates)
+    for pivot, pattern, _ in stream.update(pivots):
+        st = result.stats[pattern_name(pattern)]
+        t = int(times[pivot.index])
+        st.hits += 1
+        st.first_time = t if st.first_time is None else st.first_time
+        st.last_time = t
+        entry = pivot.index + depth
+        if entry + horizon < n:
+            move = float(close[entry + horizon] - close[entry]) / point
+            st.forward_sum += move
+            st.forward_up += move > 0
+            st.forward_count += 1
+    return result
+
+
+def param_grid(
+    depths: Sequence[int],
+    deviations: Sequence[float],
+    backsteps: Sequence[int],
+) -> List[ZigZagParams]:
+    """Cartesian product of zigzag parameters."""
+    return [(int(d), float(v), int(b)) for d, v, b in itertools.product(depths, deviations, backsteps)]
+
+
+@lru_cache(maxsize=8)
+def _worker_rates(path: str) -> np.ndarray:
+    # Each pool process loads a history file once and reuses it across tasks
+    return load_rates_array(path)
+
+
+@lru_cache(maxsize=8)
+def _worker_matcher(patterns_json: str) -> Matcher:
+    return compile_patterns(json.loads(patterns_json))
+
+
+def _run_chunk(
+    path: str,
+    symbol: str,
+    timeframe: str,
+    params: List[ZigZagParams],
+    patterns_json: str,
+    point: float,
+    horizon: int,
+) -> List[Dict[str, Any]]:
+    rates = _worker_rates(path)
+    matcher = _worker_matcher(patterns_json)
+    patterns = matcher.patterns
+    # One shared zigzag pass for the whole chunk
+    pivots = zigzag_multi(rates, params, point)
+    return [
+        run_backtest(rates, patterns, d, v, b, point, horizon, symbol, timeframe, matcher, arrays).to_dict()
+        for (d, v, b), arrays in zip(params, pivots)
+    ]
+
+
+def sweep(
+    datasets: Sequence[Tuple[str, str, str, float, Sequence[ZigZagParams], Sequence[PatternSpec]]],
+    horizon: int = 20,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Backtest every dataset ``(path, symbol, timeframe, point, grid, patterns)``
+    with each parameter set of its ``grid`` using a process pool.
+
+    Work is split into per-file chunks so each process loads a file once and
+    reuses it, and runs one ``zigzag_multi`` pass per chunk (the grid is
+    sorted by depth so chunks share window extrema); results come back as
+    plain dicts (``BacktestResult.to_dict``).
+    """
+    workers = workers or os.cpu_count() or 1
+    runs = sum(len(grid) for *_, grid, _ in datasets)
+    chunk = max(1, math.ceil(runs / (workers * 4)))
+
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for path, symbol, timeframe, point, grid, patterns in datasets:
+            patterns_json = json.dumps([p if isinstance(p, str) else list(p) for p in patterns])
+            grid = sorted(grid)
+            futures.extend(
+                pool.submit(_run_chunk, path, symbol, timeframe, list(grid[i:i + chunk]),
+                            patterns_json, point, horizon)
+                for i in range(0, len(grid), chunk)
+            )
+        for fut in futures:
+            results.extend(fut.result())
+    return results
@@ -9,8 +9,15 @@ from __future__ import annotations
 
 import argparse
 import json
-from dataclasses import dataclass
-from typing import List, Optional
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from core.mt5.connection import TIMEFRAMES
+from core.mt5.source import DATA_SOURCES
+from core.patterns.detector import compile_patterns
 
 try:
     import yaml  # type: ignore
@@ -18,6 +25,54 @@ except Exception:  # pragma: no cover - optional dependency
     yaml = None
 
 
+@dataclass
+class WatchConfig:
+    """One (symbol, timeframe, zigzag params, patterns) watch."""
+    symbol: str
+    timeframe: str
+    bars_to_fetch: int
+
+    # ZigZag classic
+    zz_depth: int
+    zz_deviation_points: float
+    zz_backstep: int
+
+    # Patterns: label lists or pattern-language strings (see core.patterns.dsl)
+    patterns: List[Union[List[str], str]]
+
+    # ZigZag engine: "incremental" | "classic" | "numpy"
+    zz_backend: str = "incremental"
+
+    # Compiled once by load_config; clone() it per watch state
+    matcher: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def name(self) -> str:
+        return f"{self.symbol} {self.timeframe}"
+
+    @property
+    def zz_params(self) -> Tuple[int, float, int]:
+        """(depth, deviation_points, backstep)"""
+        return self.zz_depth, self.zz_deviation_points, self.zz_backstep
+
+
+@dataclass
+class WebhookConfig:
+    """One webhook destination: routing filter plus batching / rate limits."""
+    url: str
+    symbols: List[str] = field(default_factory=list)  # empty = every symbol
+    patterns: List[Union[List[str], str]] = field(default_factory=list)  # empty = every pattern
+    batch_window_ms: int = 0  # 0 = one alert per request (plain JSON object)
+    batch_max: int = 50
+    rate_per_sec: float = 0.0  # 0 = unlimited
+    concurrency: int = 1
+
+    def accepts(self, symbol: str, pattern: Union[List[str], str]) -> bool:
+        if self.symbols and symbol not in self.symbols:
+            return False
+        return not self.patterns or _parse_pattern(pattern) in self.patterns
+
+
 @dataclass
 class AppConfig:
     """Application configuration loaded from YAML/JSON."""
@@ -35,12 +90,87 @@ class AppConfig:
     webhook_url: str
 
     # Patterns
-    patterns: List[List[str]]
+    patterns: List[Union[List[str], str]]
+
+    # ZigZag engine: "incremental" | "classic" | "numpy"
+    zz_backend: str = "incremental"
+
+    # Market data: "mt5" or "simulator" (options passed to SimulatedSource)
+    data_source: str = "mt5"
+    data_source_options: Dict[str, Any] = field(default_factory=dict)
 
     # MT5 login (optional)
     mt5_login: Optional[int] = None
     mt5_password: Optional[str] = None
     mt5_server: Optional[str] = None
+    # Session recovery: terminal_info check interval and reconnect backoff
+    mt5_health_check_sec: float = 5.0
+    mt5_reconnect_backoff_sec: float = 1.0
+    mt5_reconnect_backoff_max_sec: float = 60.0
+
+    # Webhook delivery worker
+    webhook_queue_size: int = 1000
+    webhook_max_retries: int = 5
+    webhook_backoff_sec: float = 1.0
+    webhook_backoff_max_sec: float = 60.0
+    webhook_timeout_sec: float = 10.0
+    webhook_spool_dir: Optional[str] = "webhook_spool"
+    webhook_spool_rescan_sec: float = 30.0
+    # Destinations with routing; a single one for webhook_url when "webhooks" is absent
+    webhooks: List[WebhookConfig] = field(default_factory=list)
+
+    # Per-watch compute: "serial" in the main loop, or "process" on a worker
+    # pool of execution_workers processes (0 = one per CPU)
+    execution_mode: str = "serial"
+    execution_workers: int = 0
+
+    # Alert dedup store (core.webhook.dedup); *.sqlite/*.db = SQLite, else append-only log
+    dedup_max_entries: int = 50000
+    dedup_ttl_sec: float = 3 * 86400
+    dedup_path: Optional[str] = None
+
+    # Scheduling: "bar_close" wakes just after each bar closes (broker server
+    # time), "interval" polls every poll_interval_sec
+    schedule_mode: str = "bar_close"
+    close_delay_ms: int = 200
+    fast_poll_window_ms: int = 0  # keep polling after a close until the new bar shows up
+    fast_poll_interval_ms: int = 100
+    server_offset_sec: Optional[int] = None  # None = estimate from the last tick
+    # Skip a cycle after a 2-bar probe when no bar closed since the last one
+    skip_unchanged_bars: bool = True
+
+    # Runtime metrics (core.metrics): HTTP /metrics on metrics_port (0 = off)
+    # and a summary log line every metrics_log_interval_sec (0 = off)
+    metrics_enabled: bool = False
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    metrics_log_interval_sec: float = 60.0
+
+    # Tick mode: poll ticks every tick_poll_ms between bar cycles and send
+    # "provisional" alerts for the still-forming pivot (serial execution only)
+    tick_mode: bool = False
+    tick_poll_ms: int = 100
+
+    # Timeframes built from each symbol's M1 bars instead of fetched (empty = off);
+    # one M1 update is reused for resample_max_age_sec across timeframes
+    resample_timeframes: List[str] = field(default_factory=list)
+    resample_max_age_sec: float = 0.05
+
+    # On-disk bar history shared between processes (None = in-memory only)
+    history_dir: Optional[str] = None
+
+    # Hot reload: check the config file's mtime this often and apply changes
+    # without a restart (0 = off)
+    reload_interval_sec: float = 0.0
+
+    # Watches driven by the scheduler; a single watch built from the
+    # top-level symbol/timeframe/zigzag/patterns when "watches" is absent
+    watches: List[WatchConfig] = field(default_factory=list)
+
+
+ZIGZAG_BACKENDS = ("incremental", "classic", "numpy")
+SCHEDULE_MODES = ("bar_close", "interval")
+EXECUTION_MODES = ("serial", "process")
 
 
 def load_config(path: str) -> AppConfig:
@@ -61,6 +191,17 @@ def load_config(path: str) -> AppConfig:
     # Normalize keys
     mt5_block = raw.get("mt5", {}) or {}
     zigzag = raw.get("zigzag", {}) or {}
+    schedule = raw.get("schedule", {}) or {}
+    delivery = raw.get("webhook", {}) or {}
+    history = raw.get("history", {}) or {}
+    source = dict(raw.get("data_source", {}) or {})
+    metrics_block = raw.get("metrics", {}) or {}
+    dedup = raw.get("dedup", {}) or {}
+    execution = raw.get("execution", {}) or {}
+    resample = raw.get("resample", {}) or {}
+    ticks = raw.get("ticks", {}) or {}
+    reload = raw.get("reload", {}) or {}
+    server_offset = schedule.get("server_offset_sec", "auto")
 
     cfg = AppConfig(
         symbol=raw.get("symbol", "XAUUSD"),
@@ -70,15 +211,172 @@ def load_config(path: str) -> AppConfig:
         zz_depth=int(zigzag.get("depth", 12)),
         zz_deviation_points=float(zigzag.get("deviation", 5.0)),
         zz_backstep=int(zigzag.get("backstep", 3)),
+        zz_backend=str(zigzag.get("backend", "incremental")).lower(),
         webhook_url=str(raw.get("webhook_url", "")),
-        patterns=[list(map(str, p)) for p in raw.get("patterns", [["HL", "HH", "LL", "LH", "LL"]])],
+        patterns=[_parse_pattern(p) for p in raw.get("patterns", [["HL", "HH", "LL", "LH", "LL"]])],
+        data_source=str(source.pop("type", "mt5")).lower(),
+        data_source_options=source,
         mt5_login=mt5_block.get("login"),
         mt5_password=mt5_block.get("password"),
         mt5_server=mt5_block.get("server"),
+        mt5_health_check_sec=float(mt5_block.get("health_check_sec", 5.0)),
+        mt5_reconnect_backoff_sec=float(mt5_block.get("reconnect_backoff_sec", 1.0)),
+        mt5_reconnect_backoff_max_sec=float(mt5_block.get("reconnect_backoff_max_sec", 60.0)),
+        webhook_queue_size=int(delivery.get("queue_size", 1000)),
+        webhook_max_retries=int(delivery.get("max_retries", 5)),
+        webhook_backoff_sec=float(delivery.get("backoff_sec", 1.0)),
+        webhook_backoff_max_sec=float(delivery.get("backoff_max_sec", 60.0)),
+        webhook_timeout_sec=float(delivery.get("timeout_sec", 10.0)),
+        webhook_spool_dir=delivery.get("spool_dir", "webhook_spool") or None,
+        webhook_spool_rescan_sec=float(delivery.get("spool_rescan_sec", 30)),
+        schedule_mode=str(schedule.get("mode", "bar_close")).lower(),
+        close_delay_ms=int(schedule.get("close_delay_ms", 200)),
+        fast_poll_window_ms=int(schedule.get("fast_poll_window_ms", 0)),
+        fast_poll_interval_ms=int(schedule.get("fast_poll_interval_ms", 100)),
+        server_offset_sec=None if str(server_offset).lower() == "auto" else int(server_offset),
+        skip_unchanged_bars=bool(schedule.get("skip_unchanged_bars", True)),
+        history_dir=history.get("dir") or None,
+        reload_interval_sec=float(reload.get("interval_sec", 2.0)) if reload.get("enabled", False) else 0.0,
+        tick_mode=bool(ticks.get("enabled", False)),
+        tick_poll_ms=int(ticks.get("poll_ms", 100)),
+        resample_max_age_sec=float(resample.get("max_age_ms", 50)) / 1000.0,
+        execution_mode=str(execution.get("mode", "serial")).lower(),
+        execution_workers=int(execution.get("workers", 0)),
+        dedup_max_entries=int(dedup.get("max_entries", 50000)),
+        dedup_ttl_sec=float(dedup.get("ttl_hours", 72)) * 3600,
+        dedup_path=dedup.get("path") or None,
+        metrics_enabled=bool(metrics_block.get("enabled", False)),
+        metrics_host=str(metrics_block.get("host", "127.0.0.1")),
+        metrics_port=int(metrics_block.get("port", 0)),
+        metrics_log_interval_sec=float(metrics_block.get("log_interval_sec", 60.0)),
     )
+    if cfg.data_source not in DATA_SOURCES:
+        raise ValueError(f"Unsupported data_source.type: {cfg.data_source} (use one of {', '.join(DATA_SOURCES)})")
+    if cfg.execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Unsupported execution.mode: {cfg.execution_mode} (use one of {', '.join(EXECUTION_MODES)})")
+    if cfg.tick_mode and cfg.execution_mode != "serial":
+        raise ValueError("ticks.enabled needs execution.mode: serial (pivot state lives in the workers otherwise)")
+    if cfg.history_dir and cfg.data_source != "mt5":
+        data_dir = cfg.data_source_options.get("data_dir")
+        if data_dir and os.path.abspath(str(data_dir)) == os.path.abspath(cfg.history_dir):
+            raise ValueError("data_source.data_dir must not be history.dir (simulated bars would overwrite it)")
+        # Simulated bars are cached apart from the recorded MT5 history
+        cfg.history_dir = os.path.join(cfg.history_dir, "_sim")
+    if cfg.schedule_mode not in SCHEDULE_MODES:
+        raise ValueError(f"Unsupported schedule.mode: {cfg.schedule_mode} (use one of {', '.join(SCHEDULE_MODES)})")
+    cfg.webhooks = [_parse_webhook(entry) for entry in raw.get("webhooks") or []]
+    if not cfg.webhooks and cfg.webhook_url:
+        cfg.webhooks = [WebhookConfig(url=cfg.webhook_url)]
+    cfg.watches = [w for entry in (raw.get("watches") or [{}]) for w in _parse_watches(entry, cfg)]
+    compiled: Dict[str, Any] = {}
+    for w in cfg.watches:
+        if w.timeframe.upper().strip() not in TIMEFRAMES:
+            raise ValueError(f"Unsupported timeframe: {w.timeframe} (use one of {', '.join(TIMEFRAMES)})")
+        if w.zz_backend not in ZIGZAG_BACKENDS:
+            raise ValueError(f"Unsupported zigzag.backend: {w.zz_backend} (use one of {', '.join(ZIGZAG_BACKENDS)})")
+        # Watches with the same pattern set share one compiled automaton
+        key = json.dumps(w.patterns)
+        if key not in compiled:
+            compiled[key] = compile_patterns(w.patterns)
+        w.matcher = compiled[key]
+    if resample.get("enabled", False):
+        # Default: every watched timeframe above M1
+        timeframes = resample.get("timeframes") or sorted({w.timeframe for w in cfg.watches})
+        cfg.resample_timeframes = [str(tf).upper() for tf in timeframes if str(tf).upper() != "M1"]
+        for tf in cfg.resample_timeframes:
+            if tf not in TIMEFRAMES:
+                raise ValueError(f"Unsupported resample timeframe: {tf} (use one of {', '.join(TIMEFRAMES)})")
+        if cfg.data_source == "simulator" and not cfg.data_source_options.get("data_dir"):
+            # Synthetic timeframes are independent random walks, so closed bars
+            # from the source would not match a forming bar built from M1
+            raise ValueError("resample.enabled needs MT5 or a simulator replaying data_dir "
+                             "(synthetic timeframes are not built from M1)")
     return cfg
 
 
+class ConfigWatcher:
+    """
+    Polls a config file's mtime / size and reloads it when they change.
+
+    ``poll`` returns the new AppConfig once per change; None while the file is
+    unchanged, when it was checked less than ``interval_sec`` ago, or when the
+    new file does not load or validate (logged; the running config stays).
+    """
+
+    def __init__(self, path: str, interval_sec: float = 2.0) -> None:
+        self.path = path
+        self.interval_sec = interval_sec
+        self._stamp = self._stat()
+        self._checked = time.monotonic()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self, now: Optional[float] = None) -> Optional[AppConfig]:
+        now = time.monotonic() if now is None else now
+        if now - self._checked < self.interval_sec:
+            return None
+        self._checked = now
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return None
+        # Remembered even if loading fails: a half-saved file is retried on its next write
+        self._stamp = stamp
+        try:
+            return load_config(self.path)
+        except Exception as exc:
+            logging.error("Config reload failed, keeping the running config: %s", exc)
+            return None
+
+
+def _parse_pattern(p: Any) -> Union[List[str], str]:
+    """A config pattern: a pattern-language string, or an exact label list."""
+    return str(p) if isinstance(p, str) else list(map(str, p))
+
+
+def _parse_webhook(entry: Dict[str, Any]) -> WebhookConfig:
+    """Parse one "webhooks" entry."""
+    return WebhookConfig(
+        url=str(entry["url"]),
+        symbols=[str(x) for x in entry.get("symbols", [])],
+        patterns=[_parse_pattern(p) for p in entry.get("patterns", [])],
+        batch_window_ms=int(entry.get("batch_window_ms", 0)),
+        batch_max=int(entry.get("batch_max", 50)),
+        rate_per_sec=float(entry.get("rate_per_sec", 0.0)),
+        concurrency=int(entry.get("concurrency", 1)),
+    )
+
+
+def _parse_watches(entry: Dict[str, Any], base: AppConfig) -> List[WatchConfig]:
+    """
+    Expand one "watches" entry into WatchConfigs. Missing keys fall back to the
+    top-level values; "symbol" and "timeframe" may be lists (cross product).
+    """
+    zigzag = entry.get("zigzag", {}) or {}
+    symbols = entry.get("symbol", base.symbol)
+    timeframes = entry.get("timeframe", base.timeframe)
+    patterns = entry.get("patterns")
+
+    watches: List[WatchConfig] = []
+    for symbol in (symbols if isinstance(symbols, list) else [symbols]):
+        for timeframe in (timeframes if isinstance(timeframes, list) else [timeframes]):
+            watches.append(WatchConfig(
+                symbol=str(symbol),
+                timeframe=str(timeframe),
+                bars_to_fetch=int(entry.get("bars_to_fetch", base.bars_to_fetch)),
+                zz_depth=int(zigzag.get("depth", base.zz_depth)),
+                zz_deviation_points=float(zigzag.get("deviation", base.zz_deviation_points)),
+                zz_backstep=int(zigzag.get("backstep", base.zz_backstep)),
+                zz_backend=str(zigzag.get("backend", base.zz_backend)).lower(),
+                patterns=[_parse_pattern(p) for p in patterns] if patterns is not None else base.patterns,
+            ))
+    return watches
+
+
 def parse_cli() -> argparse.Namespace:
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(description="MT5 ZigZag Classic Pattern Watcher")
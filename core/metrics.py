@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight runtime metrics: per-stage latency histograms, counters and gauges.
+
+Disabled by default; every call then returns immediately, so instrumentation
+can stay in the hot path. When enabled (``enable``), metrics can be scraped
+in Prometheus text format from ``http://<host>:<port>/metrics`` and/or
+summarized in the log every ``log_interval_sec``.
+
+Usage:
+    with metrics.timer("zigzag"):
+        ...
+    @metrics.timed("cycle")
+    def process_once(...): ...
+    metrics.inc("alerts_published_total")
+    metrics.set_gauge("webhook_queue_depth", 3)
+"""
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PREFIX = "zigzag_"
+
+# Upper bounds (seconds) of the latency buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) with running max."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+
+class _Timer:
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        observe(self.stage, time.perf_counter() - self.t0)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+_enabled = False
+_lock = threading.Lock()
+_counters: Dict[Key, float] = {}
+_gauges: Dict[Key, float] = {}
+_histograms: Dict[str, Histogram] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def timer(stage: str):
+    """Context manager recording the duration of ``stage``."""
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator recording each call's duration as ``stage``."""
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - t0)
+        return inner
+    return wrap
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record one ``stage`` latency sample."""
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = Histogram()
+        hist.observe(seconds)
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    """Add ``value`` to a counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    """Set a gauge to ``value``."""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def reset() -> None:
+    """Forget every recorded value."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        for kind, values in (("counter", _counters), ("gauge", _gauges)):
+            seen = set()
+            for (name, pairs), value in sorted(values.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    seen.add(name)
+                lines.append(f"{PREFIX}{name}{_labels(pairs)} {value:g}")
+        if _histograms:
+            name = f"{PREFIX}stage_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for stage, hist in sorted(_histograms.items()):
+                pairs = (("stage", stage),)
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_labels(pairs + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {hist.total:.6f}")
+                lines.append(f"{name}_count{_labels(pairs)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+class _Reporter:
+    """Logs per-stage latency and counter deltas since the previous summary."""
+
+    def __init__(self) -> None:
+        self._last_hist: Dict[str, Tuple[int, float]] = {}
+        self._last_counters: Dict[Key, float] = {}
+
+    def summary(self) -> str:
+        parts: List[str] = []
+        with _lock:
+            for stage, hist in sorted(_histograms.items()):
+                n0, s0 = self._last_hist.get(stage, (0, 0.0))
+                n = hist.count - n0
+                if n:
+                    parts.append(f"{stage} n={n} avg={(hist.total - s0) / n * 1000:.2f}ms max={hist.max * 1000:.1f}ms")
+                self._last_hist[stage] = (hist.count, hist.total)
+            totals: Dict[str, float] = {}
+            for key, value in _counters.items():
+                delta = value - self._last_counters.get(key, 0)
+                self._last_counters[key] = value
+                totals[key[0]] = totals.get(key[0], 0) + delta
+            parts.extend(f"{name}=+{value:g}" for name, value in sorted(totals.items()) if value)
+            for (name, pairs), value in sorted(_gauges.items()):
+                if not pairs:
+                    parts.append(f"{name}={value:g}")
+        return " | ".join(parts) or "no activity"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_stop = threading.Event()
+
+
+def enable(port: Optional[int] = None, host: str = "127.0.0.1", log_interval_sec: float = 0) -> None:
+    """
+    Start recording. With ``port`` serve ``/metrics`` over HTTP; with
+    ``log_interval_sec`` log a summary that often. Both run on daemon threads.
+    """
+    global _enabled, _server
+    _enabled = True
+    _stop.clear()
+    if port:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info("Metrics on http://%s:%d/metrics", host, port)
+    if log_interval_sec > 0:
+        reporter = _Reporter()
+
+        def run() -> None:
+            while not _stop.wait(log_interval_sec):
+                logging.info("Metrics: %s", reporter.summary())
+
+        threading.Thread(target=run, name="metrics-log", daemon=True).start()
+
+
+def disable() -> None:
+    """Stop recording and shut the HTTP endpoint / summary log down."""
+    global _enabled, _server
+    _enabled = False
+    _stop.set()
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -3,14 +3,67 @@
 
 """
 MetaTrader 5 connection and data retrieval utilities.
+
+Calls go through the active ``DataSource`` (``core.mt5.source``): the MT5
+terminal by default, or e.g. the simulator via ``set_data_source``.
 """
 
 import logging
-from typing import Optional
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
 
-import MetaTrader5 as mt5
+import numpy as np
 import pandas as pd
 
+from core import metrics
+from core.mt5.history import ColumnView, HistoryCache
+from core.mt5.source import TICK_DTYPE, DataSource, MT5Source
+
+# MetaTrader5 TIMEFRAME_* constants (fixed by the MT5 API)
+TIMEFRAME_CONSTANTS = {
+    "M1": 1,
+    "M5": 5,
+    "M15": 15,
+    "M30": 30,
+    "H1": 16385,
+    "H4": 16388,
+    "D1": 16408,
+    "W1": 32769,
+    "MN1": 49153,
+}
+TIMEFRAMES = tuple(TIMEFRAME_CONSTANTS)
+
+# Fixed bar lengths; MN1 is calendar based
+TIMEFRAME_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+    "W1": 604800,
+}
+
+# Active data source; MT5Source is created on first use
+_source: Optional[DataSource] = None
+
+
+def set_data_source(source: Optional[DataSource]) -> None:
+    """Route every call in this module to ``source`` (None = the MT5 terminal)."""
+    global _source
+    _source = source
+    reset_rates_cache()
+
+
+def get_data_source() -> DataSource:
+    """The active data source."""
+    global _source
+    if _source is None:
+        _source = MT5Source()
+    return _source
+
 
 def timeframe_to_mt5(tf: str) -> int:
     """
@@ -18,54 +71,473 @@ def timeframe_to_mt5(tf: str) -> int:
     Supports: M1,M5,M15,M30,H1,H4,D1,W1,MN1
     """
     tf = tf.upper().strip()
-    mapping = {
-        "M1": mt5.TIMEFRAME_M1,
-        "M5": mt5.TIMEFRAME_M5,
-        "M15": mt5.TIMEFRAME_M15,
-        "M30": mt5.TIMEFRAME_M30,
-        "H1": mt5.TIMEFRAME_H1,
-        "H4": mt5.TIMEFRAME_H4,
-        "D1": mt5.TIMEFRAME_D1,
-        "W1": mt5.TIMEFRAME_W1,
-        "MN1": mt5.TIMEFRAME_MN1,
-    }
-    if tf not in mapping:
+    if tf not in TIMEFRAME_CONSTANTS:
         raise ValueError(f"Unsupported timeframe: {tf}")
-    return mapping[tf]
+    return TIMEFRAME_CONSTANTS[tf]
+
+
+def timeframe_name(timeframe: int) -> str:
+    """Inverse of ``timeframe_to_mt5``."""
+    for tf, const in TIMEFRAME_CONSTANTS.items():
+        if const == timeframe:
+            return tf
+    raise ValueError(f"Unsupported timeframe constant: {timeframe}")
+
+
+# MT5 last_error codes of a lost terminal link (IPC send / receive failed,
+# initialize failed, no IPC connection, IPC timeout)
+SESSION_ERRORS = (-10001, -10002, -10003, -10004, -10005)
+
+# Session opened by init_mt5_with_login, and every symbol selected through this module
+_session: Optional["MT5Session"] = None
+_selected: Set[str] = set()
 
 
-def init_mt5_with_login(login: Optional[int], password: Optional[str], server: Optional[str]) -> None:
+class MT5Session:
     """
-    Initialize MT5 connection. If login parameters are provided, use them.
+    Keeps the data-source session alive across terminal disconnects.
+
+    The session is marked dead when a call fails with one of
+    ``SESSION_ERRORS``, or when ``terminal_info`` (checked every
+    ``health_check_sec``) finds no terminal or no trade-server link. ``ensure``
+    then reconnects, one attempt per call with jittered exponential backoff in
+    between so the caller's loop never blocks, and on success re-selects every
+    selected symbol and backfills the bars each cached series missed
+    (``backfill_rates``).
+
+    Metrics: ``session_recovery`` (seconds from detection to recovery),
+    ``session_gap_bars`` (largest gap of the last outage, in bars),
+    ``mt5_disconnects_total``, ``mt5_reconnects_total{result}``.
     """
-    if login is not None and password is not None and server is not None:
-        ok = mt5.initialize(login=login, password=password, server=server)
-    else:
-        ok = mt5.initialize()
 
-    if not ok:
-        raise RuntimeError(f"MT5 initialize failed: {mt5.last_error()}")
-    logging.info("MT5 initialized.")
+    def __init__(
+        self,
+        login: Optional[int] = None,
+        password: Optional[str] = None,
+        server: Optional[str] = None,
+        backoff_sec: float = 1.0,
+        backoff_max_sec: float = 60.0,
+        health_check_sec: float = 5.0,
+    ) -> None:
+        self.login = login
+        self.password = password
+        self.server = server
+        self.backoff_sec = backoff_sec
+        self.backoff_max_sec = backoff_max_sec
+        self.health_check_sec = health_check_sec
+        self.alive = False
+        self.down_since: Optional[float] = None  # time.monotonic() of detection
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._checked = 0.0
+
+    def connect(self) -> None:
+        """First connection; raises RuntimeError like ``DataSource.initialize``."""
+        get_data_source().initialize(self.login, self.password, self.server)
+        self.alive = True
+        self._checked = time.monotonic()
+
+    def mark_dead(self, reason: Any) -> None:
+        if not self.alive:
+            return
+        logging.error("MT5 session lost: %s", reason)
+        metrics.inc("mt5_disconnects_total")
+        self.alive = False
+        self.down_since = time.monotonic()
+        self._attempts = 0
+        self._retry_at = 0.0
+
+    def _healthy(self) -> bool:
+        info = get_data_source().terminal_info()
+        return info is not None and bool(getattr(info, "connected", True))
+
+    def ensure(self, now: Optional[float] = None) -> bool:
+        """
+        True when the session is usable. Otherwise reconnects if the backoff
+        allows and returns whether that worked. ``now`` is ``time.monotonic()``.
+        """
+        now = time.monotonic() if now is None else now
+        if self.alive:
+            if now - self._checked < self.health_check_sec:
+                return True
+            self._checked = now
+            if self._healthy():
+                return True
+            self.mark_dead(f"terminal_info: {get_data_source().last_error()}")
+        if now < self._retry_at:
+            return False
+        return self._reconnect(now)
+
+    def seconds_until_retry(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return 0.0 if self.alive else max(0.0, self._retry_at - now)
+
+    def _reconnect(self, now: float) -> bool:
+        source = get_data_source()
+        self._attempts += 1
+        try:
+            try:
+                source.shutdown()  # drop the stale IPC link first
+            except Exception:  # pragma: no cover - already gone
+                pass
+            source.initialize(self.login, self.password, self.server)
+            if not self._healthy():
+                raise RuntimeError(f"terminal not connected: {source.last_error()}")
+            # The link can drop again mid-recovery; that is a failed attempt too
+            # (backfill merges, so the next attempt redoes it safely)
+            failed = select_symbols(sorted(_selected))
+            if failed:
+                logging.warning("Could not re-select %s after reconnect", ", ".join(failed))
+            # Tick mode resumes from now rather than replaying the outage
+            _tick_cursor.clear()
+            gap = backfill_rates()
+        except Exception as exc:
+            delay = min(self.backoff_max_sec, self.backoff_sec * (2 ** (self._attempts - 1)))
+            delay *= random.uniform(0.5, 1.0)
+            self._retry_at = now + delay
+            metrics.inc("mt5_reconnects_total", result="failed")
+            logging.warning("MT5 reconnect attempt %d failed: %s, retry in %.1fs", self._attempts, exc, delay)
+            return False
+
+        recovery = time.monotonic() - (self.down_since or now)
+        self.alive = True
+        self.down_since = None
+        self._checked = time.monotonic()
+        metrics.inc("mt5_reconnects_total", result="ok")
+        metrics.observe("session_recovery", recovery)
+        metrics.set_gauge("session_gap_bars", gap)
+        logging.info("MT5 session recovered after %.1fs (%d attempt(s)), backfilled up to %d bar(s) per series",
+                     recovery, self._attempts, gap)
+        return True
+
+
+def init_mt5_with_login(
+    login: Optional[int],
+    password: Optional[str],
+    server: Optional[str],
+    backoff_sec: float = 1.0,
+    backoff_max_sec: float = 60.0,
+    health_check_sec: float = 5.0,
+) -> MT5Session:
+    """
+    Initialize MT5 connection. If login parameters are provided, use them.
+    Returns the ``MT5Session``; call its ``ensure`` each loop to survive disconnects.
+    """
+    global _session
+    source = get_data_source()
+    session = MT5Session(login, password, server, backoff_sec, backoff_max_sec, health_check_sec)
+    session.connect()
+    _session = session
+    logging.info("%s initialized.", "MT5" if source.name == "mt5" else f"Data source '{source.name}'")
+    return session
 
 
 def shutdown_mt5() -> None:
     """Shutdown MT5 safely."""
+    global _session
+    _session = None
     try:
-        mt5.shutdown()
+        get_data_source().shutdown()
         logging.info("MT5 shutdown.")
     except Exception as exc:  # pragma: no cover - defensive
         logging.warning("MT5 shutdown warning: %s", exc)
 
 
+def _failure(message: str) -> RuntimeError:
+    """Count a failed source call, flag a lost session, and build the error to raise."""
+    err = get_data_source().last_error()
+    metrics.inc("mt5_errors_total")
+    if _session is not None and isinstance(err, tuple) and err and err[0] in SESSION_ERRORS:
+        _session.mark_dead(err)
+    return RuntimeError(f"{message}: {err}")
+
+
+class RatesRing:
+    """
+    Fixed-capacity ring buffer of MT5 rate records.
+
+    Backed by a mirrored array of ``2 * capacity`` rows (every row is written at
+    ``k`` and ``k + capacity``), so the latest rows are always one contiguous
+    slice and ``view`` never copies.
+    """
+
+    def __init__(self, capacity: int, dtype: np.dtype) -> None:
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # next write slot in [0, capacity)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def last_time(self) -> Optional[int]:
+        if not self._size:
+            return None
+        return int(self._data["time"][self._head + self.capacity - 1])
+
+    def push(self, rows: np.ndarray) -> None:
+        """Append rows in chronological order, evicting the oldest."""
+        rows = rows[-self.capacity:]
+        m = len(rows)
+        if not m:
+            return
+        slots = (self._head + np.arange(m)) % self.capacity
+        self._data[slots] = rows
+        self._data[slots + self.capacity] = rows
+        self._head = (self._head + m) % self.capacity
+        self._size = min(self._size + m, self.capacity)
+
+    def set_last(self, row: np.void) -> None:
+        """Overwrite the newest row in place (still-forming bar)."""
+        slot = (self._head - 1) % self.capacity
+        self._data[slot] = row
+        self._data[slot + self.capacity] = row
+
+    def view(self, count: Optional[int] = None) -> np.ndarray:
+        """The newest ``count`` rows, oldest first, as a view into the buffer."""
+        size = self._size if count is None else min(count, self._size)
+        end = self._head + self.capacity
+        return self._data[end - size:end]
+
+
+# Per (symbol, timeframe) bar history kept between get_rates calls
+_rate_rings: Dict[Tuple[str, int], RatesRing] = {}
+
+# Optional on-disk history (see set_history_dir); replaces the rings when set
+_history: Optional[HistoryCache] = None
+# Largest full fetch per (symbol, timeframe) this run (history may be shorter)
+_history_filled: Dict[Tuple[str, int], int] = {}
+
+# Bars requested per delta fetch once warm; grown until it overlaps the cache
+DELTA_FETCH_BARS = 3
+
+# Timeframes derived from M1 (see set_resampling), None = all fetched directly
+_resampler = None
+
+# Newest tick (time_msc) returned per symbol by get_new_ticks
+_tick_cursor: Dict[str, int] = {}
+# Ticks requested per get_new_ticks call
+TICK_BATCH = 10000
+
+
+def _copy_rates(symbol: str, timeframe: int, count: int) -> np.ndarray:
+    source = get_data_source()
+    with metrics.timer("copy_rates"):
+        rates = source.copy_rates(symbol, timeframe, count)
+    if rates is None or len(rates) == 0:
+        raise _failure(f"Failed to fetch rates for {symbol}")
+    metrics.inc("bars_fetched_total", len(rates))
+    return rates
+
+
+def _fetch_newer(symbol: str, timeframe: int, last: int, count: int) -> Optional[np.ndarray]:
+    """
+    Fetch the fewest newest bars that reach back to the cached bar ``last``.
+    Returns None when ``count`` bars would not line up (gap, refetch in full).
+    """
+    fetch = DELTA_FETCH_BARS
+    while fetch < count:
+        rates = _copy_rates(symbol, timeframe, fetch)
+        if int(rates["time"][0]) <= last <= int(rates["time"][-1]):
+            return rates
+        fetch *= 4
+    return None
+
+
+def _apply_delta(ring: RatesRing, rates: np.ndarray) -> None:
+    """Merge rates that overlap the ring's newest bar into ``ring``."""
+    times = rates["time"]
+    pos = int(np.searchsorted(times, ring.last_time, side="left"))
+    if pos < len(rates) and int(times[pos]) == ring.last_time:
+        ring.set_last(rates[pos])
+        pos += 1
+    ring.push(rates[pos:])
+
+
+def set_history_dir(root: Optional[str]) -> None:
+    """
+    Keep bar history in memory-mapped files under ``root`` (see
+    ``core.mt5.history``) instead of in-process ring buffers; None turns it off.
+    """
+    global _history
+    _history = HistoryCache(root) if root else None
+    _history_filled.clear()
+
+
+def set_resampling(timeframes: Optional[Sequence[str]], max_age_sec: float = 0.05) -> None:
+    """
+    Build ``timeframes`` (M5 ... MN1) from each symbol's M1 bars (see
+    ``core.mt5.resample``) instead of fetching them; None / empty turns it off.
+    """
+    global _resampler
+    if timeframes:
+        from core.mt5.resample import Resampler
+        _resampler = Resampler(timeframes, max_age_sec)
+    else:
+        _resampler = None
+
+
+def reset_rates_cache(symbol: Optional[str] = None) -> None:
+    """Drop cached bar history (for one symbol, or all) so the next fetch is full."""
+    for key in [k for k in _rate_rings if symbol is None or k[0] == symbol]:
+        del _rate_rings[key]
+    for key in [k for k in _history_filled if symbol is None or k[0] == symbol]:
+        del _history_filled[key]
+    for key in [k for k in _tick_cursor if symbol is None or k == symbol]:
+        del _tick_cursor[key]
+    if _resampler is not None:
+        _resampler.reset(symbol)
+
+
+def backfill_rates() -> int:
+    """
+    After an outage, bring every cached series up to date with one ranged
+    fetch of exactly the bars since its newest cached bar (no full refetch).
+    Series that cannot be backfilled are left to the next regular fetch.
+    Returns the largest number of new bars in one series.
+    """
+    source = get_data_source()
+    # Past the newest bar whatever the broker's server time zone
+    until = int(time.time()) + 86400
+    if _history is not None:
+        cached = [((symbol, timeframe_to_mt5(tf)), series) for (symbol, tf), series in _history.items()]
+    else:
+        cached = list(_rate_rings.items())
+    largest = 0
+    for (symbol, timeframe), target in cached:
+        last = target.last_time
+        if last is None:
+            continue
+        with metrics.timer("copy_rates"):
+            rates = source.copy_rates_range(symbol, timeframe, last, until)
+        if rates is None or not len(rates) or int(rates["time"][0]) != last:
+            logging.warning("Backfill of %s %s failed: %s", symbol, timeframe_name(timeframe), source.last_error())
+            continue
+        gap = len(rates) - 1
+        metrics.inc("bars_fetched_total", len(rates))
+        metrics.inc("backfill_bars_total", gap)
+        if isinstance(target, RatesRing):
+            _apply_delta(target, rates)
+            view = target.view()
+        else:
+            target.merge(rates)
+            view = target.read()
+        if _resampler is not None and timeframe == TIMEFRAME_CONSTANTS["M1"]:
+            _resampler.feed(symbol, view)
+        largest = max(largest, gap)
+    return largest
+
+
+def _history_rates(symbol: str, timeframe: int, count: int) -> ColumnView:
+    series = _history.series(symbol, timeframe_name(timeframe))
+    key = (symbol, timeframe)
+    rates = None
+    if len(series) >= count or (len(series) and _history_filled.get(key, 0) >= count):
+        rates = _fetch_newer(symbol, timeframe, series.last_time, count)
+        if rates is None:
+            logging.info("Rates gap for %s, refetching %d bars", symbol, count)
+    if rates is None:
+        rates = _copy_rates(symbol, timeframe, count)
+        _history_filled[key] = count
+        first = int(rates["time"][0])
+        if len(series) and not int(series.read()["time"][0]) <= first <= series.last_time:
+            # Stored history is shorter than requested, or would get a hole: start over
+            series.replace(rates)
+    series.merge(rates)
+    return series.read(count)
+
+
+def get_rates_array(symbol: str, timeframe: int, count: int) -> Union[np.ndarray, ColumnView]:
+    """
+    Fetch latest OHLC rates as the raw MT5 record array ('time' in epoch seconds).
+
+    The first call per (symbol, timeframe) downloads ``count`` bars into a ring
+    buffer; later calls only fetch the few newest bars, fix up the still-forming
+    bar in place and append the rest. The returned array is a view into that
+    buffer and is overwritten by the next call — copy it to keep it.
+
+    With ``set_history_dir`` the bars go to the on-disk history instead and a
+    memory-mapped ``ColumnView`` is returned (indexed by column name the same way).
+    Timeframes passed to ``set_resampling`` come from the M1 bars instead.
+    """
+    if _resampler is not None:
+        if _resampler.handles(timeframe):
+            return _resampler.rates(symbol, timeframe, count)
+        if timeframe == TIMEFRAME_CONSTANTS["M1"]:
+            rates = _fetch_rates_array(symbol, timeframe, count)
+            _resampler.feed(symbol, rates)
+            return rates
+    return _fetch_rates_array(symbol, timeframe, count)
+
+
+def _fetch_rates_array(symbol: str, timeframe: int, count: int) -> Union[np.ndarray, ColumnView]:
+    if _history is not None:
+        return _history_rates(symbol, timeframe, count)
+
+    key = (symbol, timeframe)
+    ring = _rate_rings.get(key)
+    if ring is not None and ring.capacity >= count and len(ring):
+        rates = _fetch_newer(symbol, timeframe, ring.last_time, count)
+        if rates is not None:
+            _apply_delta(ring, rates)
+            return ring.view(count)
+        logging.info("Rates gap for %s, refetching %d bars", symbol, count)
+
+    rates = _copy_rates(symbol, timeframe, count)
+    ring = RatesRing(count, rates.dtype)
+    ring.push(rates)
+    _rate_rings[key] = ring
+    return ring.view(count)
+
+
+def get_last_bars(symbol: str, timeframe: int, count: int = 2) -> np.ndarray:
+    """
+    The newest ``count`` bars straight from the source, bypassing the caches
+    (cheap probe: with count=2, the last closed bar and the forming one).
+    Resampled timeframes are served from their M1-derived bars.
+    """
+    if _resampler is not None and _resampler.handles(timeframe):
+        return _resampler.last_bars(symbol, timeframe, count)
+    return _copy_rates(symbol, timeframe, count)
+
+
+def get_new_ticks(symbol: str) -> np.ndarray:
+    """
+    Ticks (MT5 tick record array) that arrived since the previous call for
+    ``symbol``; the first call only sets the starting point and returns none.
+    """
+    source = get_data_source()
+    last = _tick_cursor.get(symbol)
+    if last is None:
+        tick = source.symbol_info_tick(symbol)
+        if tick is None:
+            raise RuntimeError(f"No tick for {symbol}: {source.last_error()}")
+        _tick_cursor[symbol] = int(getattr(tick, "time_msc", 0) or tick.time * 1000)
+        return np.empty(0, dtype=TICK_DTYPE)
+    with metrics.timer("copy_ticks"):
+        ticks = source.copy_ticks_from(symbol, last // 1000, TICK_BATCH)
+    if ticks is None:
+        raise _failure(f"Failed to fetch ticks for {symbol}")
+    ticks = ticks[ticks["time_msc"] > last]
+    if len(ticks):
+        _tick_cursor[symbol] = int(ticks["time_msc"][-1])
+        metrics.inc("ticks_fetched_total", len(ticks))
+    return ticks
+
+
 def get_rates(symbol: str, timeframe: int, count: int) -> pd.DataFrame:
     """
     Fetch latest OHLC rates as DataFrame with tz-aware UTC 'time'.
     """
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
-    if rates is None or len(rates) == 0:
-        raise RuntimeError(f"Failed to fetch rates for {symbol}: {mt5.last_error()}")
-    df = pd.DataFrame(rates)
-    df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
+    rates = get_rates_array(symbol, timeframe, count)
+    with metrics.timer("dataframe"):
+        df = pd.DataFrame(rates.columns if isinstance(rates, ColumnView) else rates)
+        df["time"] = pd.to_datetime(df["time"], unit="s", utc=True)
     return df
 
 
@@ -74,10 +546,7 @@ def get_available_symbols():
     Get list of available symbols from MT5.
     Returns a list of symbol names.
     """
-    symbols = mt5.symbols_get()
-    if symbols is None:
-        return []
-    return [s.name for s in symbols]
+    return get_data_source().symbols_get()
 
 
 def select_symbol(symbol: str) -> bool:
@@ -85,20 +554,73 @@ def select_symbol(symbol: str) -> bool:
     Ensure symbol is selected in Market Watch.
     Returns True if successful, False otherwise.
     """
-    result = mt5.symbol_select(symbol, True)
+    result = get_data_source().symbol_select(symbol)
     if not result:
         available = get_available_symbols()
-        logging.warning(f"Failed to select symbol {symbol}. Error: {mt5.last_error()}")
+        logging.warning(f"Failed to select symbol {symbol}. Error: {get_data_source().last_error()}")
         logging.info(f"Available symbols include: {available[:10]}" + 
                    ("..." if len(available) > 10 else ""))
+    else:
+        _selected.add(symbol)
     return result
 
 
+def select_symbols(symbols: Sequence[str]) -> List[str]:
+    """
+    Select many symbols in one pass (start-up, reconnect). Returns the ones
+    that failed, logged once instead of per symbol.
+    """
+    source = get_data_source()
+    failed = []
+    for symbol in symbols:
+        if source.symbol_select(symbol):
+            _selected.add(symbol)
+        else:
+            failed.append(symbol)
+    if failed:
+        logging.warning("Failed to select %s. Error: %s", ", ".join(failed), source.last_error())
+    return failed
+
+
+def get_server_time_offset(symbols: Sequence[str], granularity: int = 900,
+                           max_age: int = 120) -> Optional[int]:
+    """
+    Estimate broker server time minus UTC (seconds) from the freshest last tick
+    of ``symbols``, rounded to ``granularity``. Bar times from MT5 are in server
+    time.
+
+    Broker offsets are whole multiples of ``granularity``, so a tick whose
+    time is more than ``max_age`` seconds off such a multiple is old (market
+    closed, symbol not trading) and says nothing about the offset. Returns
+    None when no symbol has a fresh tick.
+    """
+    source = get_data_source()
+    now = time.time()
+    freshest = 0
+    for symbol in dict.fromkeys(symbols):
+        tick = source.symbol_info_tick(symbol)
+        if tick is not None and tick.time:
+            freshest = max(freshest, int(tick.time))
+    if not freshest:
+        logging.warning("No tick for %s, keeping the server time offset", ", ".join(symbols))
+        return None
+    diff = freshest - now
+    offset = int(round(diff / granularity)) * granularity
+    if abs(diff - offset) > max_age:
+        logging.info("Last tick is %.0f s off a whole offset, keeping the server time offset",
+                     abs(diff - offset))
+        return None
+    return offset
+
+
 def get_symbol_info(symbol: str):
     """
     Get symbol information.
     """
-    sym = mt5.symbol_info(symbol)
+    sym = get_data_source().symbol_info(symbol)
     if sym is None:
-        raise RuntimeError(f"symbol_info({symbol}) failed: {mt5.last_error()}")
+        raise RuntimeError(f"symbol_info({symbol}) failed: {get_data_source().last_error()}")
+    if _history is not None and sym.point:
+        # Backtests on this history read it back (FileRatesSource.point_for)
+        _history.save_point(symbol, float(sym.point))
     return sym
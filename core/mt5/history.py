@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+On-disk OHLC history cache shared by the live watcher, backtests and test.py.
+
+Layout: ``<root>/<SYMBOL>/<TF>/<column>.bin``, one append-only file of fixed
+width values per rates column, plus ``<root>/<SYMBOL>/symbol.json`` with the
+symbol's point so offline backtests use the same deviation as live. Reads are memory-mapped, so several processes
+can share one copy of history without each holding it in RAM.
+"""
+
+import json
+import os
+import sys
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Same layout as MT5 copy_rates_* record arrays
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("tick_volume", "<u8"),
+    ("spread", "<i4"),
+    ("real_volume", "<u8"),
+])
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """Exclusive advisory lock on ``path`` (serializes writers across processes)."""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":  # pragma: no cover - platform specific
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ColumnView:
+    """
+    Read-only columnar view of rates (``view["high"]``, ``len(view)``, slicing).
+
+    Columns are memory-mapped arrays, so indexing and slicing never copy;
+    ``to_records`` builds an MT5-style record array when one is needed.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], dtype: np.dtype = RATES_DTYPE) -> None:
+        self.columns = columns
+        self.dtype = dtype
+
+    def __len__(self) -> int:
+        return len(self.columns["time"])
+
+    def __getitem__(self, key: Union[str, slice]) -> Union[np.ndarray, "ColumnView"]:
+        if isinstance(key, str):
+            return self.columns[key]
+        return ColumnView({name: col[key] for name, col in self.columns.items()}, self.dtype)
+
+    def to_records(self) -> np.ndarray:
+        rates = np.empty(len(self), dtype=self.dtype)
+        for name in self.dtype.names:
+            rates[name] = self.columns[name]
+        return rates
+
+
+class HistorySeries:
+    """Append-only column files for one (symbol, timeframe)."""
+
+    def __init__(self, path: str, dtype: np.dtype = RATES_DTYPE) -> None:
+        self.path = path
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+        self._maps: Dict[str, np.ndarray] = {}
+        self._mapped_rows = -1
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self) -> int:
+        # Columns are appended one after another; the shortest one is complete
+        rows: List[int] = []
+        for name in self.dtype.names:
+            try:
+                rows.append(os.path.getsize(self._file(name)) // self.dtype[name].itemsize)
+            except OSError:
+                return 0
+        return min(rows)
+
+    @property
+    def last_time(self) -> Optional[int]:
+        n = len(self)
+        if not n:
+            return None
+        return int(self.read()["time"][n - 1])
+
+    def read(self, count: Optional[int] = None) -> ColumnView:
+        """Memory-mapped view of the newest ``count`` rows (all rows if None)."""
+        n = len(self)
+        if n != self._mapped_rows:
+            self._maps = {
+                name: (np.memmap(self._file(name), dtype=self.dtype[name], mode="r", shape=(n,))
+                       if n else np.empty(0, dtype=self.dtype[name]))
+                for name in self.dtype.names
+            }
+            self._mapped_rows = n
+        view = ColumnView(self._maps, self.dtype)
+        return view if count is None or count >= n else view[n - count:]
+
+    def _release(self) -> None:
+        # Windows refuses to replace or shrink a file that is still mapped
+        self._maps = {}
+        self._mapped_rows = -1
+
+    def replace(self, rates: np.ndarray) -> None:
+        """
+        Start the history over with ``rates``. This series' own maps are
+        released first. On POSIX other readers keep their old mapping. On
+        Windows the files must not be mapped by another reader at that moment
+        (``os.replace`` raises ``PermissionError``).
+        """
+        self._release()
+        with _locked(os.path.join(self.path, ".lock")):
+            for name in self.dtype.names:
+                tmp = self._file(name) + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(np.ascontiguousarray(rates[name], dtype=self.dtype[name]).tobytes())
+                os.replace(tmp, self._file(name))
+
+    def merge(self, rates: np.ndarray) -> Tuple[int, int]:
+        """
+        Merge freshly fetched rates: the row matching the last stored bar is
+        rewritten in place (still-forming bar), newer rows are appended, older
+        rows are ignored. Returns (updated, appended).
+        """
+        with _locked(os.path.join(self.path, ".lock")):
+            n = len(self)
+            last = self.last_time
+            times = rates["time"]
+            start = 0
+            updated = 0
+            if last is not None:
+                start = int(np.searchsorted(times, last, side="left"))
+                if start < len(rates) and int(times[start]) == last:
+                    row = rates[start]
+                    for name in self.dtype.names:
+                        width = self.dtype[name].itemsize
+                        with open(self._file(name), "r+b") as f:
+                            f.seek((n - 1) * width)
+                            f.write(np.asarray(row[name], dtype=self.dtype[name]).tobytes())
+                    updated = 1
+                    start += 1
+            new = rates[start:]
+            if len(new):
+                for name in self.dtype.names:
+                    path = self._file(name)
+                    size = n * self.dtype[name].itemsize
+                    if os.path.exists(path) and os.path.getsize(path) > size:
+                        # Drop a torn tail left by an interrupted append (unmapped first, see _release)
+                        self._release()
+                        with open(path, "r+b") as f:
+                            f.truncate(size)
+                    with open(path, "ab") as f:
+                        f.write(np.ascontiguousarray(new[name], dtype=self.dtype[name]).tobytes())
+        return updated, len(new)
+
+
+class HistoryCache:
+    """Root directory of ``HistorySeries`` keyed by (symbol, timeframe name)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._series: Dict[Tuple[str, str], HistorySeries] = {}
+
+    def series(self, symbol: str, timeframe: str) -> HistorySeries:
+        key = (symbol, timeframe.upper())
+        if key not in self._series:
+            self._series[key] = HistorySeries(os.path.join(self.root, symbol, key[1]))
+        return self._series[key]
+
+    def items(self) -> List[Tuple[Tuple[str, str], HistorySeries]]:
+        """Series opened so far, keyed by (symbol, timeframe name)."""
+        return list(self._series.items())
+
+    def _info_file(self, symbol: str) -> str:
+        return os.path.join(self.root, symbol, "symbol.json")
+
+    def point(self, symbol: str) -> Optional[float]:
+        """Point recorded by ``save_point``, None if unknown."""
+        try:
+            with open(self._info_file(symbol), "r", encoding="utf-8") as f:
+                return float(json.load(f)["point"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_point(self, symbol: str, point: float) -> None:
+        """Record the symbol's point next to its bars (rewritten only if it changed)."""
+        if self.point(symbol) == point:
+            return
+        path = self._info_file(symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"point": point}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Higher timeframes derived locally from M1 bars.
+
+One M1 series per symbol feeds every derived timeframe of that symbol. A
+derived series is seeded once (closed bars from the source, the forming bar
+rebuilt from M1); after that each M1 bar, new or still forming, updates it in
+O(1). Buckets are cut on the bar times themselves, which MT5 reports in broker
+server time, so D1 / W1 / MN1 bars open at server midnight / Sunday / the 1st
+like the terminal's own.
+
+Enabled through ``core.mt5.connection.set_resampling``; ``get_rates_array``,
+``get_rates`` and ``get_last_bars`` then serve the derived timeframes.
+"""
+
+import calendar
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+from core.mt5.connection import (
+    TIMEFRAME_SECONDS,
+    RatesRing,
+    _copy_rates,
+    get_rates_array,
+    timeframe_name,
+    timeframe_to_mt5,
+)
+
+M1 = 1
+
+# Epoch day 0 is a Thursday; MT5 weekly bars open on Sunday
+_WEEK_ANCHOR = 3 * 86400
+
+# M1 bars read per update (the M1 cache keeps more if an M1 watch asks for more)
+M1_BARS = 64
+
+# (open, high, low, close, tick_volume, spread, real_volume)
+_Bar = Tuple[float, float, float, float, int, int, int]
+_FIELDS = ("open", "high", "low", "close", "tick_volume", "spread", "real_volume")
+
+
+def bar_open(tf: str, t: int) -> int:
+    """Open time of the ``tf`` bar containing time ``t`` (epoch seconds, server time)."""
+    if tf == "MN1":
+        d = datetime.fromtimestamp(t, tz=timezone.utc)
+        return calendar.timegm((d.year, d.month, 1, 0, 0, 0))
+    period = TIMEFRAME_SECONDS[tf]
+    anchor = _WEEK_ANCHOR if tf == "W1" else 0
+    return (t - anchor) // period * period + anchor
+
+
+def _merge(base: Optional[_Bar], bar: _Bar) -> _Bar:
+    if base is None:
+        return bar
+    return (base[0], max(base[1], bar[1]), min(base[2], bar[2]), bar[3],
+            base[4] + bar[4], bar[5], base[6] + bar[6])
+
+
+class _Derived:
+    """
+    One derived (symbol, timeframe) series: a ring of its bars plus the
+    aggregate of the closed M1 bars of the forming one, so applying an M1 bar
+    is O(1) whether it is new or a revision of the newest.
+    """
+
+    __slots__ = ("tf", "ring", "bucket", "base", "m1_time", "m1_bar")
+
+    def __init__(self, tf: str, ring: RatesRing) -> None:
+        self.tf = tf
+        self.ring = ring
+        self.bucket: Optional[int] = None  # open time of the forming derived bar
+        self.base: Optional[_Bar] = None  # closed M1 bars of that bar
+        self.m1_time: Optional[int] = None  # newest M1 bar applied
+        self.m1_bar: Optional[_Bar] = None
+
+    def apply(self, t: int, bar: _Bar) -> None:
+        if self.m1_time is not None:
+            if t < self.m1_time:
+                return
+            if t > self.m1_time:
+                # The previous M1 bar has closed
+                self.base = _merge(self.base, self.m1_bar)
+        self.m1_time, self.m1_bar = t, bar
+        bucket = bar_open(self.tf, t)
+        if bucket != self.bucket:
+            self.bucket, self.base = bucket, None
+            self.ring.push(np.array([(bucket,) + bar], dtype=self.ring.dtype))
+            return
+        self.ring.set_last((bucket,) + _merge(self.base, bar))
+
+
+class Resampler:
+    """
+    Serves ``timeframes`` from one M1 series per symbol.
+
+    Args:
+        timeframes: derived timeframe names (M5 ... MN1)
+        max_age_sec: reuse an M1 update this recent instead of asking the
+            source again, so the timeframes of one symbol polled together cost
+            one M1 delta fetch (0 = always ask)
+    """
+
+    def __init__(self, timeframes: Sequence[str], max_age_sec: float = 0.05) -> None:
+        self.timeframes: Dict[int, str] = {}
+        for tf in timeframes:
+            const = timeframe_to_mt5(tf)
+            if const == M1:
+                raise ValueError("M1 is the resampling source, not a derived timeframe")
+            self.timeframes[const] = timeframe_name(const)
+        self.max_age_sec = max_age_sec
+        self._derived: Dict[Tuple[str, int], _Derived] = {}
+        self._fed: Dict[str, float] = {}
+
+    def handles(self, timeframe: int) -> bool:
+        return timeframe in self.timeframes
+
+    def reset(self, symbol: Optional[str] = None) -> None:
+        for key in [k for k in self._derived if symbol is None or k[0] == symbol]:
+            del self._derived[key]
+        for key in [k for k in self._fed if symbol is None or k == symbol]:
+            del self._fed[key]
+
+    def rates(self, symbol: str, timeframe: int, count: int) -> np.ndarray:
+        """Newest ``count`` derived bars (a view into the ring, like ``get_rates_array``)."""
+        derived = self._derived.get((symbol, timeframe))
+        if derived is None or derived.ring.capacity < count:
+            derived = self._seed(symbol, timeframe, count, get_rates_array(symbol, M1, M1_BARS))
+        else:
+            self._refresh(symbol)
+            derived = self._derived[(symbol, timeframe)]
+        return derived.ring.view(count)
+
+    def last_bars(self, symbol: str, timeframe: int, count: int) -> np.ndarray:
+        """Newest ``count`` derived bars; straight from the source until seeded."""
+        if (symbol, timeframe) not in self._derived:
+            return _copy_rates(symbol, timeframe, count)
+        return self.rates(symbol, timeframe, count)[-count:].copy()
+
+    def feed(self, symbol: str, m1: Any) -> None:
+        """Apply the newest M1 bars (record array or ``ColumnView``) to the symbol's derived series."""
+        self._fed[symbol] = time.monotonic()
+        derived = [(k, d) for k, d in self._derived.items() if k[0] == symbol]
+        if not derived:
+            return
+        times = m1["time"]
+        oldest = min(d.m1_time for _, d in derived)
+        pos = int(np.searchsorted(times, oldest, side="left"))
+        tail_times: List[int] = times[pos:].tolist()
+        rows = list(zip(*(m1[name][pos:].tolist() for name in _FIELDS)))
+        for key, d in derived:
+            if pos == len(times) or tail_times[0] > d.m1_time:
+                # M1 bars were missed (long gap): rebuild from the source
+                logging.info("M1 gap for %s %s, reseeding", key[0], d.tf)
+                metrics.inc("resample_reseeds_total")
+                del self._derived[key]
+                self._seed(key[0], key[1], d.ring.capacity, m1)
+                continue
+            for t, bar in zip(tail_times, rows):
+                d.apply(t, bar)
+
+    def _refresh(self, symbol: str) -> None:
+        if time.monotonic() - self._fed.get(symbol, float("-inf")) >= self.max_age_sec:
+            # Feeds every derived series through the hook in get_rates_array
+            get_rates_array(symbol, M1, M1_BARS)
+
+    def _seed(self, symbol: str, timeframe: int, count: int, m1: Any) -> _Derived:
+        """Closed bars from the source; the forming one rebuilt from the M1 bars ``m1`` (newest last)."""
+        tf = self.timeframes[timeframe]
+        rates = _copy_rates(symbol, timeframe, count)
+        last = int(m1["time"][-1])
+        bucket = bar_open(tf, last)
+        if int(m1["time"][0]) > bucket:
+            # Forming bar is longer than the cached M1 tail: one larger fetch
+            m1 = _copy_rates(symbol, M1, (last - bucket) // 60 + 1)
+        times = m1["time"]
+        pos = int(np.searchsorted(times, bucket, side="left"))
+
+        derived = _Derived(tf, RatesRing(count, rates.dtype))
+        derived.ring.push(rates[rates["time"] < bucket])
+        for t, bar in zip(times[pos:].tolist(), zip(*(m1[name][pos:].tolist() for name in _FIELDS))):
+            derived.apply(t, bar)
+        self._derived[(symbol, timeframe)] = derived
+        return derived
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic market simulator implementing ``DataSource``.
+
+Bars are either synthetic (a seeded random walk per symbol and timeframe) or
+recorded files read through ``core.backtest.data.FileRatesSource``, and are
+revealed on a simulated clock running ``speed`` times faster than wall time.
+The still-forming bar grows towards its final OHLC as the clock moves, so
+the same run always produces the same bars and the same pivots.
+"""
+
+import math
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from core.mt5.connection import TIMEFRAME_SECONDS, TIMEFRAMES, timeframe_name
+from core.mt5.history import RATES_DTYPE
+from core.mt5.source import TICK_DTYPE, DataSource
+
+# Epoch day 0 is a Thursday; weekly bars open on Sunday
+_WEEK_ANCHOR = 3 * 86400
+
+# Synthetic bars are generated lazily in blocks of this size
+_BLOCK = 4096
+
+
+class _Series:
+    """Bars of one (symbol, timeframe) with open times on a fixed grid."""
+
+    def __init__(self, period: int, bars: np.ndarray, extend: Optional[Callable[[int], np.ndarray]] = None) -> None:
+        self.period = period
+        self.bars = bars
+        self.extend = extend
+
+    def upto(self, k: int) -> np.ndarray:
+        """Bars ``[0, k)``; synthetic series are generated on demand."""
+        while self.extend is not None and len(self.bars) < k:
+            self.bars = np.concatenate([self.bars, self.extend(max(_BLOCK, k - len(self.bars)))])
+        return self.bars[:k]
+
+
+class SimulatedSource(DataSource):
+    """
+    Replays synthetic or recorded bars for many symbols.
+
+    Args:
+        symbols: symbol names, or a number of synthetic symbols (SIM000, SIM001, ...)
+        speed: simulated seconds per wall-clock second (0 = only ``advance`` moves time)
+        seed: random walk seed
+        start: simulated epoch time at ``initialize`` (default: wall time)
+        history_bars: closed bars available at ``start``
+        data_dir: replay ``<SYMBOL>_<TF>`` files (see ``core.backtest.data``) instead
+            of synthetic bars; their times are shifted by whole weeks onto the clock
+            (one shift per symbol, so its timeframes cover the same period)
+        point, price, volatility: synthetic symbol point, start price and
+            per-minute close-to-close standard deviation
+        tick_interval: simulated seconds between ticks; a tick's bid is the
+            close of the forming M1 bar at that moment
+        clock: wall clock (default ``time.time``)
+
+    ``disconnect`` simulates a lost terminal: calls fail with MT5's
+    "No IPC connection" error until ``initialize`` reconnects, keeping the
+    clock and the bars.
+    """
+
+    name = "simulator"
+
+    def __init__(
+        self,
+        symbols: Union[int, Sequence[str]] = 10,
+        speed: float = 1.0,
+        seed: int = 0,
+        start: Optional[float] = None,
+        history_bars: int = 5000,
+        data_dir: Optional[str] = None,
+        point: float = 0.0001,
+        price: float = 1.1,
+        volatility: float = 0.0005,
+        tick_interval: float = 0.25,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if isinstance(symbols, int):
+            symbols = [f"SIM{i:03d}" for i in range(symbols)]
+        self.symbols: List[str] = [str(s) for s in symbols]
+        self.speed = float(speed)
+        self.seed = int(seed)
+        self.history_bars = int(history_bars)
+        self.point = float(point)
+        self.price = float(price)
+        self.volatility = float(volatility)
+        self.tick_interval = float(tick_interval)
+        self.clock = clock
+        self._start = start
+        self._wall0 = clock()
+        self._sim0 = float(start) if start is not None else self._wall0
+        self._offset = 0.0
+        self._series: Dict[Tuple[str, int], _Series] = {}
+        self._shifts: Dict[str, int] = {}
+        self._files = None
+        if data_dir:
+            from core.backtest.data import FileRatesSource
+            self._files = FileRatesSource(data_dir)
+        self._error: Tuple[int, str] = (1, "Success")
+        self._down = False
+        self._failures = 0  # reconnect attempts still to fail
+
+    # -- clock ---------------------------------------------------------------
+
+    def time(self) -> float:
+        """Current simulated (server) time, epoch seconds."""
+        return self._sim0 + (self.clock() - self._wall0) * self.speed + self._offset
+
+    def advance(self, seconds: float) -> None:
+        """Move the simulated clock forward."""
+        self._offset += seconds
+
+    def disconnect(self, failures: int = 0) -> None:
+        """Drop the connection; the first ``failures`` reconnect attempts fail too."""
+        self._down = True
+        self._failures = failures
+
+    def _offline(self) -> bool:
+        if self._down:
+            self._error = (-10004, "No IPC connection")
+        return self._down
+
+    # -- DataSource ----------------------------------------------------------
+
+    def initialize(self, login: Optional[int] = None, password: Optional[str] = None,
+                   server: Optional[str] = None) -> None:
+        if self._down:
+            if self._failures > 0:
+                self._failures -= 1
+                self._error = (-10003, "IPC initialize failed")
+                raise RuntimeError(f"MT5 initialize failed: {self._error}")
+            self._down = False
+            return
+        self._wall0 = self.clock()
+        self._sim0 = float(self._start) if self._start is not None else self._wall0
+        self._offset = 0.0
+        self._series.clear()
+        self._shifts.clear()
+
+    def shutdown(self) -> None:
+        # Bars are kept: a reconnect (shutdown + initialize) sees the same market
+        pass
+
+    def last_error(self) -> Any:
+        return self._error
+
+    def terminal_info(self) -> Any:
+        if self._offline():
+            return None
+        return SimpleNamespace(name="simulator", connected=True)
+
+    def _bars_now(self, symbol: str, timeframe: int) -> Tuple[np.ndarray, float, int]:
+        """Bars up to the forming one, the current time and the bar period."""
+        series = self._get_series(symbol, timeframe)
+        now = self.time()
+        times = series.bars["time"]
+        origin = int(times[0]) if len(times) else 0
+        if series.extend is not None:
+            k = int((now - origin) // series.period) + 1
+        else:
+            k = int(np.searchsorted(times, now, side="right"))
+        return series.upto(k), now, series.period
+
+    def copy_rates(self, symbol: str, timeframe: int, count: int) -> Optional[np.ndarray]:
+        if self._offline():
+            return None
+        if symbol not in self.symbols:
+            self._error = (-1, f"Unknown symbol {symbol}")
+            return None
+        bars, now, period = self._bars_now(symbol, timeframe)
+        rates = bars[max(0, len(bars) - count):].copy()
+        if not len(rates):
+            self._error = (-1, f"No bars for {symbol} yet")
+            return None
+        _form(rates[-1], (now - int(rates[-1]["time"])) / period)
+        return rates
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: int, date_to: int) -> Optional[np.ndarray]:
+        if self._offline():
+            return None
+        if symbol not in self.symbols:
+            self._error = (-1, f"Unknown symbol {symbol}")
+            return None
+        bars, now, period = self._bars_now(symbol, timeframe)
+        lo = int(np.searchsorted(bars["time"], date_from, side="left"))
+        hi = int(np.searchsorted(bars["time"], date_to, side="right"))
+        rates = bars[lo:hi].copy()
+        if len(rates) and hi == len(bars):
+            _form(rates[-1], (now - int(rates[-1]["time"])) / period)
+        return rates
+
+    def symbol_info(self, symbol: str) -> Any:
+        if self._offline():
+            return None
+        if symbol not in self.symbols:
+            return None
+        digits = max(0, int(round(-math.log10(self.point)))) if self.point > 0 else 0
+        return SimpleNamespace(name=symbol, point=self.point, digits=digits)
+
+    def symbol_info_tick(self, symbol: str) -> Any:
+        if self._offline():
+            return None
+        if symbol not in self.symbols:
+            return None
+        now = self.time()
+        return SimpleNamespace(time=int(now), time_msc=int(now * 1000))
+
+    def copy_ticks_from(self, symbol: str, date_from: int, count: int) -> Optional[np.ndarray]:
+        if self._offline():
+            return None
+        if symbol not in self.symbols:
+            self._error = (-1, f"Unknown symbol {symbol}")
+            return None
+        now = self.time()
+        step = self.tick_interval
+        first = math.ceil(date_from / step) * step
+        n = min(count, int((now - first) // step) + 1) if now >= first else 0
+        ticks = np.zeros(max(n, 0), dtype=TICK_DTYPE)
+        if not n:
+            return ticks
+        t = first + step * np.arange(n)
+        series = self._get_series(symbol, 1)
+        origin = int(series.bars["time"][0])
+        bars = series.upto(int((now - origin) // series.period) + 1) if series.extend is not None else series.bars
+        k = np.clip(np.searchsorted(bars["time"], t, side="right") - 1, 0, len(bars) - 1)
+        frac = np.clip((t - bars["time"][k]) / series.period, 0.0, 1.0)
+        ticks["bid"] = bars["open"][k] + (bars["close"][k] - bars["open"][k]) * frac
+        ticks["ask"] = ticks["bid"] + bars["spread"][k] * self.point
+        ticks["time_msc"] = np.round(t * 1000).astype(np.int64)
+        ticks["time"] = ticks["time_msc"] // 1000
+        return ticks
+
+    def symbol_select(self, symbol: str) -> bool:
+        return not self._offline() and symbol in self.symbols
+
+    def symbols_get(self) -> List[str]:
+        return list(self.symbols)
+
+    # -- bars ----------------------------------------------------------------
+
+    def _get_series(self, symbol: str, timeframe: int) -> _Series:
+        key = (symbol, timeframe)
+        if key not in self._series:
+            tf = timeframe_name(timeframe)
+            if tf not in TIMEFRAME_SECONDS:
+                raise ValueError(f"Timeframe {tf} is not simulated (use one of {', '.join(TIMEFRAMES[:-1])})")
+            period = TIMEFRAME_SECONDS[tf]
+            if self._files is not None:
+                self._series[key] = self._recorded(symbol, tf, period)
+            else:
+                self._series[key] = self._synthetic(symbol, tf, period)
+        return self._series[key]
+
+    def _recorded(self, symbol: str, tf: str, period: int) -> _Series:
+        bars = np.array(self._files.get_rates_array(symbol, tf), dtype=RATES_DTYPE)
+        bars["time"] += self._shift(symbol)
+        return _Series(period, bars)
+
+    def _shift(self, symbol: str) -> int:
+        """
+        Seconds added to every recorded bar time of ``symbol``: whole weeks
+        (keeping session/weekend gaps and D1/W1 alignment) that put bar
+        ``history_bars`` of its finest recorded timeframe at the clock's start.
+        """
+        if symbol not in self._shifts:
+            finest = next((tf for tf in TIMEFRAME_SECONDS if self._files.path_for(symbol, tf)), None)
+            if finest is None:
+                raise RuntimeError(f"No history file for {symbol} in {self._files.root}")
+            times = self._files.get_rates_array(symbol, finest)["time"]
+            pivot = int(times[min(self.history_bars, len(times) - 1)])
+            week = TIMEFRAME_SECONDS["W1"]
+            self._shifts[symbol] = int((self._sim0 - pivot) // week) * week
+        return self._shifts[symbol]
+
+    def _synthetic(self, symbol: str, tf: str, period: int) -> _Series:
+        anchor = _WEEK_ANCHOR if tf == "W1" else 0
+        first = (int(self._sim0) - anchor) // period * period + anchor - self.history_bars * period
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), period])
+        sigma = self.volatility * math.sqrt(period / 60.0)
+        state = {"time": first, "close": self.price}
+
+        def extend(n: int) -> np.ndarray:
+            steps = rng.normal(0.0, sigma, size=(3, n))
+            bars = np.zeros(n, dtype=RATES_DTYPE)
+            close = state["close"] + np.cumsum(steps[0])
+            opens = np.concatenate([[state["close"]], close[:-1]])
+            bars["time"] = state["time"] + period * np.arange(n)
+            bars["open"] = opens
+            bars["close"] = close
+            bars["high"] = np.maximum(opens, close) + np.abs(steps[1]) * 0.5
+            bars["low"] = np.minimum(opens, close) - np.abs(steps[2]) * 0.5
+            bars["tick_volume"] = rng.integers(1, 100, size=n) * (period // 60)
+            bars["spread"] = 1
+            state["time"] += period * n
+            state["close"] = float(close[-1])
+            return bars
+
+        return _Series(period, extend(self.history_bars + _BLOCK), extend)
+
+
+def _form(row: np.void, frac: float) -> None:
+    """Shrink a bar to its state ``frac`` of the way through (1 = closed)."""
+    frac = min(max(frac, 0.0), 1.0)
+    if frac >= 1.0:
+        return
+    o, h, l, c = float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"])
+    cur = o + (c - o) * frac
+    row["close"] = cur
+    row["high"] = max(o, cur) + (h - max(o, c)) * frac
+    row["low"] = min(o, cur) - (min(o, c) - l) * frac
+    row["tick_volume"] = int(row["tick_volume"] * frac)
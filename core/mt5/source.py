@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Market-data sources behind ``core.mt5.connection``.
+
+``DataSource`` is the small subset of the MetaTrader5 API the watcher uses.
+``MT5Source`` forwards to the real terminal; ``core.mt5.simulator.SimulatedSource``
+replays synthetic or recorded bars so the pipeline runs without one.
+Timeframes are the MT5 integer constants (``connection.timeframe_to_mt5``).
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+import numpy as np
+
+try:
+    import MetaTrader5 as mt5  # type: ignore
+except Exception:  # pragma: no cover - optional dependency (Windows only)
+    mt5 = None
+
+# Record layout of MT5 copy_ticks_from (times are server epoch seconds / ms)
+TICK_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("last", "<f8"),
+    ("volume", "<u8"),
+    ("time_msc", "<i8"),
+    ("flags", "<u4"),
+    ("volume_real", "<f8"),
+])
+
+
+class DataSource(ABC):
+    """Interface of a market-data source (every method but ``last_error`` is required)."""
+
+    name = "base"
+
+    @abstractmethod
+    def initialize(self, login: Optional[int] = None, password: Optional[str] = None,
+                   server: Optional[str] = None) -> None:
+        """Connect; raise RuntimeError on failure."""
+
+    @abstractmethod
+    def shutdown(self) -> None:
+        """Disconnect (no error if already disconnected)."""
+
+    def last_error(self) -> Any:
+        return None
+
+    @abstractmethod
+    def terminal_info(self) -> Any:
+        """Object with ``connected`` (trade server link up), or None if the terminal is unreachable."""
+
+    @abstractmethod
+    def copy_rates(self, symbol: str, timeframe: int, count: int) -> Optional[np.ndarray]:
+        """The newest ``count`` bars (MT5 rates record array, oldest first), None on failure."""
+
+    @abstractmethod
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: int, date_to: int) -> Optional[np.ndarray]:
+        """Bars opening within [``date_from``, ``date_to``] (server epoch seconds), None on failure."""
+
+    @abstractmethod
+    def symbol_info(self, symbol: str) -> Any:
+        """Object with at least ``name``, ``point`` and ``digits``, or None."""
+
+    @abstractmethod
+    def symbol_info_tick(self, symbol: str) -> Any:
+        """Object with ``time`` (server epoch seconds) of the last tick, or None."""
+
+    @abstractmethod
+    def copy_ticks_from(self, symbol: str, date_from: int, count: int) -> Optional[np.ndarray]:
+        """Up to ``count`` ticks from ``date_from`` (server epoch seconds) on, oldest first, None on failure."""
+
+    @abstractmethod
+    def symbol_select(self, symbol: str) -> bool:
+        """Add ``symbol`` to the watched set; False if unknown."""
+
+    @abstractmethod
+    def symbols_get(self) -> List[str]:
+        """Names of all symbols the source knows."""
+
+
+class MT5Source(DataSource):
+    """The MetaTrader 5 terminal (needs the MetaTrader5 package, Windows)."""
+
+    name = "mt5"
+
+    def __init__(self) -> None:
+        if mt5 is None:
+            raise RuntimeError("MetaTrader5 is not installed, run: pip install MetaTrader5")
+
+    def initialize(self, login: Optional[int] = None, password: Optional[str] = None,
+                   server: Optional[str] = None) -> None:
+        if login is not None and password is not None and server is not None:
+            ok = mt5.initialize(login=login, password=password, server=server)
+        else:
+            ok = mt5.initialize()
+        if not ok:
+            raise RuntimeError(f"MT5 initialize failed: {mt5.last_error()}")
+
+    def shutdown(self) -> None:
+        mt5.shutdown()
+
+    def last_error(self) -> Any:
+        return mt5.last_error()
+
+    def terminal_info(self) -> Any:
+        return mt5.terminal_info()
+
+    def copy_rates(self, symbol: str, timeframe: int, count: int) -> Optional[np.ndarray]:
+        return mt5.copy_rates_from_pos(symbol, timeframe, 0, count)
+
+    def copy_rates_range(self, symbol: str, timeframe: int, date_from: int, date_to: int) -> Optional[np.ndarray]:
+        return mt5.copy_rates_range(symbol, timeframe, date_from, date_to)
+
+    def symbol_info(self, symbol: str) -> Any:
+        return mt5.symbol_info(symbol)
+
+    def symbol_info_tick(self, symbol: str) -> Any:
+        return mt5.symbol_info_tick(symbol)
+
+    def copy_ticks_from(self, symbol: str, date_from: int, count: int) -> Optional[np.ndarray]:
+        return mt5.copy_ticks_from(symbol, date_from, count, mt5.COPY_TICKS_ALL)
+
+    def symbol_select(self, symbol: str) -> bool:
+        return bool(mt5.symbol_select(symbol, True))
+
+    def symbols_get(self) -> List[str]:
+        symbols = mt5.symbols_get()
+        return [s.name for s in symbols] if symbols is not None else []
+
+
+DATA_SOURCES = ("mt5", "simulator")
+
+
+def create_source(kind: str = "mt5", **options: Any) -> DataSource:
+    """Build a data source by name; ``options`` go to the simulator."""
+    if kind == "mt5":
+        return MT5Source()
+    if kind == "simulator":
+        from core.mt5.simulator import SimulatedSource
+        return SimulatedSource(**options)
+    raise ValueError(f"Unsupported data source: {kind} (use one of {', '.join(DATA_SOURCES)})")
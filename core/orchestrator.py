@@ -6,80 +6,379 @@ Orchestrator module that coordinates the ZigZag pattern detection process.
 """
 
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
 
-from core.config.config import AppConfig
-from core.mt5.connection import get_rates, get_symbol_info
-from core.patterns.detector import PatternBuffer, classify_pivots_hhhl
-from core.webhook.sender import build_payload, send_webhook
-from core.zigzag.calculator import zigzag_classic
+import numpy as np
 
+from core import metrics
+from core.config.config import AppConfig, WatchConfig
+from core.mt5.connection import get_last_bars, get_rates, get_rates_array, get_symbol_info
+from core.mt5.resample import bar_open
+from core.patterns.detector import PatternStream, compile_patterns
+from core.webhook.dedup import AlertDedup
+from core.webhook.sender import WebhookDispatcher, build_payload, send_webhook
+from core.zigzag.calculator import IncrementalZigZag, Pivot, PivotSeries, zigzag_classic, zigzag_multi, zigzag_numpy
 
-def process_once(cfg: AppConfig, tf_const: int, state: Dict[str, Any]) -> None:
+
+class Leg:
+    """
+    The move after the last pivot, i.e. where the next (opposite) pivot will
+    come from: its most extreme price so far, the bar it is in, and the
+    index of the forming bar. Kept per watch for tick mode.
+    """
+
+    __slots__ = ("pivot", "price", "time", "index", "forming_index", "checked")
+
+    def __init__(self, pivot: Pivot, price: Optional[float], time: int, index: int, forming_index: int) -> None:
+        self.pivot = pivot
+        self.price = price  # None until a bar after the pivot exists
+        self.time = time
+        self.index = index
+        self.forming_index = forming_index
+        self.checked = False  # provisional pivot evaluated at this extreme
+
+
+def track_leg(state: Dict[str, Any], pivots: PivotSeries, times: Any, highs: Any, lows: Any) -> None:
+    """Set ``state["leg"]`` / ``state["pivots"]`` from this cycle's bars (epoch ``times``)."""
+    state["pivots"] = pivots
+    if not len(pivots):
+        state.pop("leg", None)
+        return
+    last = pivots[-1]
+    n = len(times)
+    start = int(np.searchsorted(times, last.epoch, side="right"))
+    # Bar positions in the window map to pivot indices relative to the pivot's bar
+    base = last.index - (start - 1)
+    leg = Leg(last, None, last.epoch, last.index, base + n - 1)
+    if start < n:
+        values = np.asarray(lows[start:] if last.kind == "H" else highs[start:])
+        k = int(values.argmin() if last.kind == "H" else values.argmax())
+        leg.price, leg.time, leg.index = float(values[k]), int(times[start + k]), base + start + k
+    state["leg"] = leg
+
+
+def symbol_point(watch: WatchConfig, state: Dict[str, Any]) -> float:
+    """Symbol point (for deviation in points), looked up once per watch."""
+    if "point" not in state:
+        sym = get_symbol_info(watch.symbol)
+        state["point"] = sym.point if sym.point else 0.0001  # fallback
+    return state["point"]
+
+
+def fetch_rates(watch: WatchConfig, tf_const: int, state: Dict[str, Any]):
+    """Latest ``bars_to_fetch`` bars as a record array / ColumnView; sets ``state["last_bar_time"]``."""
+    rates = get_rates_array(watch.symbol, tf_const, watch.bars_to_fetch)
+    state["last_bar_time"] = int(rates["time"][-1])
+    return rates
+
+
+def compute_pivots(watch: WatchConfig, tf_const: int, state: Dict[str, Any]) -> Tuple[PivotSeries, float]:
+    """
+    Fetch bars and run the configured ZigZag backend.
+
+    Backends (``watch.zz_backend``):
+        - incremental: ``state["zigzag"]`` is only fed the bars that are new or
+          still forming since the previous cycle; pivot indices count bars
+          from the first cycle.
+        - classic: full ``zigzag_classic`` recompute over the fetched window.
+        - numpy: ``zigzag_numpy`` directly on the raw MT5 record array.
+
+    Also records ``state["last_bar_time"]`` (epoch seconds, server time) of
+    the newest fetched bar, and ``state["leg"]`` for tick mode (``track_leg``).
+
+    Returns:
+        (pivots, last_close)
+    """
+    point = symbol_point(watch, state)
+
+    if watch.zz_backend == "numpy":
+        rates = fetch_rates(watch, tf_const, state)
+        with metrics.timer("zigzag"):
+            arrays = zigzag_numpy(rates, watch.zz_depth, watch.zz_deviation_points, watch.zz_backstep, point)
+            pivots = arrays.to_pivots()
+        track_leg(state, pivots, rates["time"], rates["high"], rates["low"])
+        return pivots, float(rates["close"][-1])
+
+    df = get_rates(watch.symbol, tf_const, watch.bars_to_fetch)
+    last_close = float(df["close"].iloc[-1])
+    state["last_bar_time"] = int(df["time"].iloc[-1].timestamp())
+
+    epochs = df["time"].values.astype("datetime64[s]").astype(np.int64)
+
+    if watch.zz_backend == "classic":
+        with metrics.timer("zigzag"):
+            pivots = zigzag_classic(
+                highs=df["high"],
+                lows=df["low"],
+                times=df["time"],
+                depth=watch.zz_depth,
+                deviation_points=watch.zz_deviation_points,
+                backstep=watch.zz_backstep,
+                point=point,
+            )
+        track_leg(state, pivots, epochs, df["high"].values, df["low"].values)
+        return pivots, last_close
+
+    if "zigzag" not in state:
+        state["zigzag"] = IncrementalZigZag(
+            depth=watch.zz_depth,
+            deviation_points=watch.zz_deviation_points,
+            backstep=watch.zz_backstep,
+            point=point,
+        )
+    zz: IncrementalZigZag = state["zigzag"]
+    with metrics.timer("zigzag"):
+        zz.feed(df["high"], df["low"], epochs)
+    track_leg(state, zz.pivots, epochs, df["high"].values, df["low"].values)
+    return zz.pivots, last_close
+
+
+def _probe(watch: WatchConfig, tf_const: int) -> Tuple[Any, ...]:
+    bars = get_last_bars(watch.symbol, tf_const, 2)
+    closed = bars[0]
+    return (int(closed["time"]), float(closed["open"]), float(closed["high"]),
+            float(closed["low"]), float(closed["close"]), int(bars[-1]["time"]))
+
+
+def bars_changed(
+    watch: WatchConfig,
+    tf_const: int,
+    state: Dict[str, Any],
+    probe: Optional[Tuple[Any, ...]] = None,
+) -> bool:
+    """
+    Probe the last closed bar and the forming bar's open time. Returns False
+    when neither changed since the previous full cycle, i.e. no bar closed and
+    the closed history was not revised. The probe is only stored once the
+    cycle has fetched its bars (``state["probe_pending"]``). Pass ``probe`` to
+    reuse one already taken for the same symbol / timeframe.
+    """
+    probe = _probe(watch, tf_const) if probe is None else probe
+    state["probe_pending"] = probe
+    return probe != state.get("probe")
+
+
+def _skip_cycle(cfg: AppConfig, watch: WatchConfig, tf_const: int, state: Dict[str, Any],
+                probe: Optional[Tuple[Any, ...]] = None) -> bool:
+    if not cfg.skip_unchanged_bars or bars_changed(watch, tf_const, state, probe):
+        return False
+    state["skipped_cycles"] = state.get("skipped_cycles", 0) + 1
+    metrics.inc("cycles_skipped_total")
+    logging.debug("[%s] No new closed bar, cycle skipped", watch.name)
+    return True
+
+
+def group_key(watch: WatchConfig) -> Optional[Hashable]:
+    """
+    Watches with the same key differ only in ZigZag params / patterns and can
+    share one fetch and ZigZag pass (``process_group``). None for the
+    incremental backend, whose pivots are indexed from its first cycle.
+    """
+    if watch.zz_backend == "incremental":
+        return None
+    return watch.symbol, watch.timeframe, watch.bars_to_fetch
+
+
+@metrics.timed("cycle")
+def process_once(
+    cfg: AppConfig,
+    watch: WatchConfig,
+    tf_const: int,
+    state: Dict[str, Any],
+    dispatcher: Optional[WebhookDispatcher] = None,
+) -> None:
     """
-    Single polling cycle: fetch data → compute zigzag → update buffer → match → webhook.
+    Single polling cycle for one watch: fetch data → compute zigzag → stream new
+    pivots through labelling + matcher (same path as ``core.patterns.replay``) → webhook.
+
+    ``state`` belongs to this watch and persists between its cycles. Alerts are
+    published to ``dispatcher``, which routes, batches and delivers them in the
+    background; without one they are POSTed inline to ``cfg.webhook_url``.
+
+    With ``cfg.skip_unchanged_bars`` the cycle returns right after a 2-bar
+    probe while no new bar has closed (``bars_changed``); skipped cycles are
+    counted in ``state["skipped_cycles"]``.
 
     Duplicate suppression:
-        fingerprint = (symbol, timeframe_str, tuple(pattern), last_pivot_index)
+        fingerprint = (symbol, timeframe_str, zigzag params, backend, pattern,
+        matched_pivot_time) in ``state["alerts"]``, an ``AlertDedup`` (the scheduler shares one,
+        optionally persisted, across watches; a private in-memory one otherwise)
     """
-    df = get_rates(cfg.symbol, tf_const, cfg.bars_to_fetch)
+    if _skip_cycle(cfg, watch, tf_const, state):
+        return
 
-    # Symbol point (for deviation in points)
-    sym = get_symbol_info(cfg.symbol)
-    point = sym.point if sym.point else 0.0001  # fallback
+    pivots, last_close = compute_pivots(watch, tf_const, state)
+    state["probe"] = state.pop("probe_pending", None)
+    metrics.set_gauge("pivots", len(pivots), watch=watch.name)
+    publish_alerts(cfg, watch, state, compute_alerts(watch, state, pivots, last_close), dispatcher)
 
-    pivots = zigzag_classic(
-        highs=df["high"],
-        lows=df["low"],
-        times=df["time"],
-        depth=cfg.zz_depth,
-        deviation_points=cfg.zz_deviation_points,
-        backstep=cfg.zz_backstep,
-        point=point,
-    )
 
-    if not pivots:
-        logging.info("No pivots detected yet.")
+@metrics.timed("cycle")
+def process_group(
+    cfg: AppConfig,
+    members: Sequence[Tuple[WatchConfig, Dict[str, Any]]],
+    tf_const: int,
+    dispatcher: Optional[WebhookDispatcher] = None,
+) -> None:
+    """
+    ``process_once`` for (watch, state) pairs sharing a ``group_key``: one
+    probe, one bar fetch and one ``zigzag_multi`` pass for all of them, then
+    matching and alerts per watch. Classic-backend members get the same pivots
+    from the NumPy engine.
+    """
+    probe = _probe(members[0][0], tf_const) if cfg.skip_unchanged_bars else None
+    members = [(w, s) for w, s in members if not _skip_cycle(cfg, w, tf_const, s, probe)]
+    if not members:
+        return
+
+    first, first_state = members[0]
+    point = symbol_point(first, first_state)
+    rates = fetch_rates(first, tf_const, first_state)
+    with metrics.timer("zigzag"):
+        series = zigzag_multi(rates, [w.zz_params for w, _ in members], point)
+    last_close = float(rates["close"][-1])
+
+    for (watch, state), arrays in zip(members, series):
+        state["point"] = point
+        state["last_bar_time"] = first_state["last_bar_time"]
+        state["probe"] = state.pop("probe_pending", None)
+        pivots = arrays.to_pivots()
+        track_leg(state, pivots, rates["time"], rates["high"], rates["low"])
+        metrics.set_gauge("pivots", len(pivots), watch=watch.name)
+        publish_alerts(cfg, watch, state, compute_alerts(watch, state, pivots, last_close), dispatcher)
+
+
+@metrics.timed("ticks")
+def process_ticks(
+    cfg: AppConfig,
+    watch: WatchConfig,
+    state: Dict[str, Any],
+    ticks: np.ndarray,
+    dispatcher: Optional[WebhookDispatcher] = None,
+) -> None:
+    """
+    Tick-mode step for one watch: extend the leg after the last pivot with the
+    ticks' bids and, once it has moved the ZigZag deviation from that pivot,
+    test its extreme as the next pivot without consuming it
+    (``PatternStream.peek``). Matches are published with stage "provisional",
+    once per leg and pattern; the bar cycle reports them "confirmed" when the
+    pivot is fixed. Costs one NumPy min/max over the ticks plus O(1) matcher
+    steps, independent of history length.
+    """
+    leg: Optional[Leg] = state.get("leg")
+    stream: Optional[PatternStream] = state.get("stream")
+    if leg is None or stream is None:
+        return
+    pivot = leg.pivot
+    if len(ticks):
+        bids = ticks["bid"]
+        k = int(bids.argmin() if pivot.kind == "H" else bids.argmax())
+        price = float(bids[k])
+        if leg.price is None or (price < leg.price if pivot.kind == "H" else price > leg.price):
+            leg.price, leg.time, leg.index, leg.checked = price, int(ticks["time"][k]), leg.forming_index, False
+    if leg.checked or leg.price is None:
+        return
+    leg.checked = True
+    if abs(leg.price - pivot.price) < watch.zz_deviation_points * state["point"]:
         return
 
-    labels = classify_pivots_hhhl(pivots)
+    provisional = Pivot(leg.index, leg.price, "L" if pivot.kind == "H" else "H", bar_open(watch.timeframe, leg.time))
+    pivots = state["pivots"][-9:] + [provisional]
+    alerts = []
+    for pattern, labels in stream.peek(provisional):
+        payload = build_payload(
+            symbol=watch.symbol,
+            timeframe_str=watch.timeframe,
+            matched_pattern=pattern,
+            buffer_snapshot=labels[-len(pattern):] if isinstance(pattern, list) else labels,
+            pivots=pivots,
+            last_close=float(ticks["bid"][-1]) if len(ticks) else leg.price,
+            stage="provisional",
+        )
+        # Keyed by the leg's starting pivot: one provisional alert per leg and pattern
+        alerts.append((pattern, pivot.epoch, payload))
+    publish_alerts(cfg, watch, state, alerts, dispatcher)
+
+
+def compute_alerts(
+    watch: WatchConfig,
+    state: Dict[str, Any],
+    pivots: PivotSeries,
+    last_close: float,
+) -> List[Tuple[Any, int, Dict[str, Any]]]:
+    """
+    Stream pivots through ``state["stream"]`` and build a payload per new hit.
+
+    The first call replays the whole history and keeps only hits ending at
+    the newest pivot. Returns ``(pattern, pivot_time, payload)`` with the
+    pivot's bar time in epoch seconds.
+    """
+    if not pivots:
+        logging.info("[%s] No pivots detected yet.", watch.name)
+        return []
 
-    # Init state
-    if "buffer" not in state:
-        state["buffer"] = PatternBuffer(maxlen=10)
-    if "last_label_count" not in state:
-        state["last_label_count"] = 0
+    if "stream" not in state:
+        buffer_len = max([10] + [len(p) for p in watch.patterns if isinstance(p, list)])
+        state["stream"] = PatternStream(watch.matcher or compile_patterns(watch.patterns), buffer_len)
+        warm_up = True
+    else:
+        warm_up = False
+
+    stream: PatternStream = state["stream"]
+    with metrics.timer("match"):
+        hits = stream.update(pivots)
+    if warm_up:
+        # First cycle replays the whole history; only alert on what ends at the newest pivot
+        hits = [h for h in hits if h[0] == pivots[-1]]
+
+    logging.info("[%s] Buffer: %s", watch.name, stream.buffer.as_list())
+
+    alerts = []
+    for pivot, pattern, labels in hits:
+        payload = build_payload(
+            symbol=watch.symbol,
+            timeframe_str=watch.timeframe,
+            matched_pattern=pattern,
+            # Pattern-language matches have no fixed length: send the whole buffer
+            buffer_snapshot=labels[-len(pattern):] if isinstance(pattern, list) else labels,
+            pivots=pivots,
+            last_close=last_close,
+        )
+        # Bar time, not index: indices shift as the fetch window rolls
+        alerts.append((pattern, pivot.epoch, payload))
+    return alerts
+
+
+def publish_alerts(
+    cfg: AppConfig,
+    watch: WatchConfig,
+    state: Dict[str, Any],
+    alerts: List[Tuple[Any, int, Dict[str, Any]]],
+    dispatcher: Optional[WebhookDispatcher] = None,
+) -> None:
+    """Drop alerts already in ``state["alerts"]`` and publish / send the rest."""
     if "alerts" not in state:
-        state["alerts"] = set()
-
-    buf: PatternBuffer = state["buffer"]
-
-    # Append only the new labels since last cycle
-    new_labels = labels[state["last_label_count"]:]
-    state["last_label_count"] = len(labels)
-    if new_labels:
-        buf.extend(new_labels)
-
-    logging.info("Buffer: %s", buf.as_list())
-
-    # Try all patterns
-    for pattern in cfg.patterns:
-        if buf.ends_with(pattern):
-            last_pivot_idx = pivots[-1].index
-            fingerprint = (cfg.symbol, cfg.timeframe, tuple(pattern), last_pivot_idx)
-            if fingerprint in state["alerts"]:
-                logging.info("Already alerted for %s at pivot %s", pattern, last_pivot_idx)
-                continue
-
-            payload = build_payload(
-                symbol=cfg.symbol,
-                timeframe_str=cfg.timeframe,
-                matched_pattern=pattern,
-                buffer_snapshot=buf.as_list()[-len(pattern):],
-                pivots=pivots,
-                last_close=float(df["close"].iloc[-1]),
-            )
+        state["alerts"] = AlertDedup(cfg.dedup_max_entries, cfg.dedup_ttl_sec)
+    seen: AlertDedup = state["alerts"]
+
+    for pattern, pivot_time, payload in alerts:
+        key = pattern if isinstance(pattern, str) else tuple(pattern)
+        # Watches on one symbol / timeframe with other zigzag settings find
+        # different pivots, so the settings are part of the fingerprint
+        fingerprint = (watch.symbol, watch.timeframe, watch.zz_params, watch.zz_backend, key, pivot_time)
+        if payload.get("stage") == "provisional":
+            fingerprint += ("provisional",)
+        if fingerprint in seen:
+            logging.info("[%s] Already alerted for %s at pivot time %s", watch.name, pattern, pivot_time)
+            metrics.inc("alerts_deduped_total")
+            continue
+
+        metrics.inc("alerts_published_total", pattern=" ".join(pattern) if isinstance(pattern, list) else pattern,
+                    stage=payload.get("stage", "confirmed"))
+        if dispatcher is not None:
+            dispatcher.publish(payload)
+        else:
             ok, msg = send_webhook(cfg.webhook_url, payload)
             (logging.info if ok else logging.warning)("Alert sent (%s): %s", "OK" if ok else "FAIL", msg)
 
-            state["alerts"].add(fingerprint)
+        seen.add(fingerprint)
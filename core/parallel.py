@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-watch compute on worker processes.
+
+The main process keeps the MT5 connection, fetches bars and copies them into
+one shared-memory block per watch; a worker maps that block (no pickling of
+bars) and runs zigzag → labels → matcher → payloads, returning only the
+alerts. Each watch is pinned to one single-process executor so its
+``PatternStream`` state lives in that worker between cycles.
+"""
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.config.config import WatchConfig
+from core.mt5.history import RATES_DTYPE, ColumnView
+from core.zigzag.calculator import zigzag_numpy
+
+# Worker-process globals: per-watch state and attached shared memory blocks
+_states: Dict[str, Dict[str, Any]] = {}
+_blocks: Dict[str, SharedMemory] = {}
+
+
+def _compute(
+    key: str,
+    block: str,
+    rows: int,
+    watch: WatchConfig,
+    point: float,
+) -> List[Tuple[Any, int, Dict[str, Any]]]:
+    # Imported here: the orchestrator pulls in MT5 / webhook modules the
+    # worker only needs for compute_alerts
+    from core.orchestrator import compute_alerts
+
+    shm = _blocks.get(block)
+    if shm is None:
+        shm = _blocks[block] = SharedMemory(name=block)
+    rates = np.ndarray((rows,), dtype=RATES_DTYPE, buffer=shm.buf)
+    arrays = zigzag_numpy(rates, watch.zz_depth, watch.zz_deviation_points, watch.zz_backstep, point)
+    state = _states.setdefault(key, {})
+    return compute_alerts(watch, state, arrays.to_pivots(), float(rates["close"][-1]))
+
+
+def _forget(key: str, block: Optional[str] = None) -> None:
+    _states.pop(key, None)
+    shm = _blocks.pop(block, None) if block else None
+    if shm is not None:
+        shm.close()
+
+
+class WatchPool:
+    """
+    Runs ``_compute`` for many watches on ``workers`` processes.
+
+    Watches are identified by a caller-assigned ``key`` (unique per watch:
+    two watches may share symbol, timeframe and zigzag params and still
+    differ in patterns), assigned round-robin to single-process executors on
+    first submit and kept there. Always uses the numpy ZigZag (same pivots as
+    classic).
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self._executors = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        self._pinned: Dict[str, int] = {}
+        self._blocks: Dict[str, SharedMemory] = {}
+
+    def _block(self, key: str, rows: int) -> SharedMemory:
+        shm = self._blocks.get(key)
+        size = max(1, rows) * RATES_DTYPE.itemsize
+        if shm is None or shm.size < size:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = self._blocks[key] = SharedMemory(create=True, size=size)
+        return shm
+
+    def submit(self, key: str, watch: WatchConfig, rates: Any, point: float) -> Future:
+        """Copy ``rates`` to the shared block of watch ``key`` and start its compute."""
+        shm = self._block(key, max(len(rates), watch.bars_to_fetch))
+        dst = np.ndarray((len(rates),), dtype=RATES_DTYPE, buffer=shm.buf)
+        if isinstance(rates, ColumnView):
+            for name in RATES_DTYPE.names:
+                dst[name] = rates[name]
+        else:
+            dst[:] = rates
+        if key not in self._pinned:
+            self._pinned[key] = len(self._pinned) % self.workers
+        # The matcher is rebuilt in the worker from the pattern list
+        light = WatchConfig(**{**watch.__dict__, "matcher": None})
+        return self._executors[self._pinned[key]].submit(_compute, key, shm.name, len(rates), light, point)
+
+    def forget(self, key: str, release: bool = False) -> None:
+        """
+        Drop the worker state (pattern stream) of watch ``key``, queued behind
+        its pending compute: after its patterns changed, or with ``release``
+        when it was removed, which also frees its shared block and pinning.
+        """
+        worker = self._pinned.pop(key, None) if release else self._pinned.get(key)
+        shm = self._blocks.pop(key, None) if release else None
+        if worker is not None:
+            self._executors[worker].submit(_forget, key, shm.name if shm is not None else None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def close(self) -> None:
+        for ex in self._executors:
+            ex.shutdown(wait=True, cancel_futures=True)
+        for shm in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks.clear()
@@ -6,12 +6,13 @@ Pattern detection module for ZigZag pivots.
 """
 
 from collections import deque
-from typing import Deque, Iterable, List
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+from core.patterns.dsl import PatternAutomaton, PatternSpec
 from core.zigzag.calculator import Pivot
 
 
-def classify_pivots_hhhl(pivots: List[Pivot]) -> List[str]:
+def classify_pivots_hhhl(pivots: Iterable[Pivot]) -> List[str]:
     """
     Label pivots into HH / HL / LH / LL by comparing to previous same-kind pivot.
     """
@@ -54,3 +55,203 @@ class PatternBuffer:
 
     def as_list(self) -> List[str]:
         return list(self._buf)
+
+    def reset(self, labels: Iterable[str] = ()) -> None:
+        self._buf.clear()
+        self.extend(labels)
+
+
+class PatternMatcher:
+    """
+    Aho–Corasick automaton over label sequences, compiled once from the pattern list.
+
+    ``advance`` consumes one label and returns every pattern that ends at it, in
+    O(1) per label regardless of how many patterns are loaded. ``state`` is a
+    plain int and may be saved / restored to rewind.
+    """
+
+    def __init__(self, patterns: Iterable[Sequence[str]]) -> None:
+        self.patterns: List[List[str]] = [list(p) for p in patterns]
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pid, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for label in pattern:
+                nxt = goto[node].get(label)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][label] = nxt
+                    goto.append({})
+                    out.append([])
+                node = nxt
+            out[node].append(pid)
+
+        # Full transition table (goto + failure links folded in), built breadth-first
+        alphabet = sorted({label for p in self.patterns for label in p})
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [{} for _ in goto]
+        todo: Deque[int] = deque()
+        for label in alphabet:
+            nxt = goto[0].get(label, 0)
+            delta[0][label] = nxt
+            if nxt:
+                todo.append(nxt)
+        while todo:
+            node = todo.popleft()
+            out[node] = out[node] + out[fail[node]]
+            for label in alphabet:
+                nxt = goto[node].get(label)
+                if nxt is None:
+                    delta[node][label] = delta[fail[node]][label]
+                else:
+                    fail[nxt] = delta[fail[node]][label]
+                    delta[node][label] = nxt
+                    todo.append(nxt)
+
+        self._delta = delta
+        self._out: List[Tuple[List[str], ...]] = [
+            tuple(self.patterns[pid] for pid in sorted(ids)) for ids in out
+        ]
+        self.state = 0
+
+    def reset(self) -> None:
+        self.state = 0
+
+    def clone(self) -> "PatternMatcher":
+        """Independent matcher sharing the compiled tables."""
+        twin = object.__new__(PatternMatcher)
+        twin.__dict__.update(self.__dict__)
+        twin.reset()
+        return twin
+
+    def advance(self, label: str, price: Optional[float] = None) -> Tuple[List[str], ...]:
+        """Consume one label; return the patterns that end at it (in config order)."""
+        self.state = self._delta[self.state].get(label, 0)
+        return self._out[self.state]
+
+
+def compile_patterns(specs: Sequence[PatternSpec]) -> Union[PatternMatcher, PatternAutomaton]:
+    """
+    Compile config patterns once: plain label lists go to the Aho–Corasick
+    ``PatternMatcher``; any DSL string (see ``core.patterns.dsl``) switches the
+    whole set to a ``PatternAutomaton``. Both are stepped with
+    ``advance(label, price)``; use ``clone()`` per watch.
+    """
+    if all(not isinstance(s, str) for s in specs):
+        return PatternMatcher(specs)
+    return PatternAutomaton(specs)
+
+
+Matcher = Union[PatternMatcher, PatternAutomaton]
+
+
+def _identity(p: Pivot) -> Tuple[int, str, float]:
+    return p.epoch, p.kind, p.price
+
+
+# (matcher state, last high, last low, buffer labels) before a pivot was consumed
+_Snapshot = Tuple[Any, Optional[float], Optional[float], Tuple[str, ...]]
+
+
+class PatternStream:
+    """
+    Streams pivots once through HH/HL/LH/LL labelling and a compiled matcher.
+
+    ``update`` takes the full pivot list every cycle and only consumes pivots
+    it has not seen. The last few pivots, which ZigZag may still move or drop,
+    are remembered with a snapshot and rewound + re-consumed if they changed,
+    so each call costs O(new pivots) and results never depend on how the
+    history was chunked. Shared by live detection and historical replay.
+    """
+
+    REWIND = 3
+
+    def __init__(self, matcher: Matcher, buffer_len: int = 10) -> None:
+        self.matcher = matcher.clone()
+        self.buffer = PatternBuffer(maxlen=buffer_len)
+        self._last_high: Optional[float] = None
+        self._last_low: Optional[float] = None
+        # (pivot identity, snapshot before it) for the newest consumed pivots
+        self._recent: Deque[Tuple[Tuple[int, str, float], _Snapshot]] = deque(maxlen=self.REWIND)
+
+    def _snapshot(self) -> _Snapshot:
+        return self.matcher.state, self._last_high, self._last_low, tuple(self.buffer.as_list())
+
+    def _restore(self, snap: _Snapshot) -> None:
+        self.matcher.state, self._last_high, self._last_low, labels = snap
+        self.buffer.reset(labels)
+
+    def _label(self, p: Pivot) -> str:
+        # Same rule as classify_pivots_hhhl, one pivot at a time
+        if p.kind == "H":
+            label = "HH" if self._last_high is None or p.price > self._last_high else "LH"
+            self._last_high = p.price
+        else:
+            label = "LL" if self._last_low is None or p.price < self._last_low else "HL"
+            self._last_low = p.price
+        return label
+
+    def _resume_at(self, pivots: Sequence[Pivot]) -> int:
+        """Rewind to the first remembered pivot that changed; return where to resume."""
+        if not self._recent:
+            return 0
+        # Locate by time: positions shift when the fetch window slides
+        t0 = self._recent[0][0][0]
+        pos = len(pivots) - 1
+        while pos >= 0 and pivots[pos].epoch > t0:
+            pos -= 1
+        keep = 0
+        if pos >= 0 and pivots[pos].epoch == t0:
+            while (keep < len(self._recent) and pos + keep < len(pivots)
+                   and self._recent[keep][0] == _identity(pivots[pos + keep])):
+                keep += 1
+            if keep == len(self._recent):
+                return pos + keep
+        else:
+            pos += 1
+        self._restore(self._recent[keep][1])
+        while len(self._recent) > keep:
+            self._recent.pop()
+        return pos + keep
+
+    def update(self, pivots: Sequence[Pivot]) -> List[Tuple[Pivot, PatternSpec, List[str]]]:
+        """
+        Consume new / changed pivots. Returns (pivot, pattern, buffer labels at
+        that pivot) for every match ending at a pivot consumed in this call.
+        """
+        hits: List[Tuple[Pivot, PatternSpec, List[str]]] = []
+        for k in range(self._resume_at(pivots), len(pivots)):
+            p = pivots[k]
+            self._recent.append((_identity(p), self._snapshot()))
+            label = self._label(p)
+            self.buffer.extend((label,))
+            for pattern in self.matcher.advance(label, p.price):
+                hits.append((p, pattern, self.buffer.as_list()))
+        return hits
+
+    def peek(self, p: Pivot) -> List[Tuple[PatternSpec, List[str]]]:
+        """
+        (pattern, buffer labels) that would match if ``p`` were the next pivot,
+        without consuming it (for a provisional, still-moving pivot).
+        """
+        snap = self._snapshot()
+        label = self._label(p)
+        self.buffer.extend((label,))
+        hits = [(pattern, self.buffer.as_list()) for pattern in self.matcher.advance(label, p.price)]
+        self._restore(snap)
+        return hits
+
+
+def replay(
+    pivots: Sequence[Pivot],
+    patterns: Union[Matcher, Sequence[PatternSpec]],
+) -> Iterator[Tuple[int, PatternSpec]]:
+    """
+    Replay historical pivots once and yield every (pivot_index, pattern) hit in
+    O(n). ``patterns`` is a compiled matcher or config patterns.
+    """
+    matcher = patterns if hasattr(patterns, "advance") else compile_patterns(patterns)
+    for p, pattern, _ in PatternStream(matcher).update(pivots):
+        yield p.index, pattern
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Small pattern language over the HH / HL / LH / LL pivot label stream.
+
+Syntax (tokens separated by whitespace where ambiguous):
+    HH HL LH LL     exact label
+    H  L            any high pivot (HH|LH) / any low pivot (HL|LL)
+    .               any label
+    ( ... )         group,  a | b  alternation
+    + * ?           repetition,  {n} {n,} {n,m}  counted repetition
+    LL[retr>=0.618] price constraint on the pivot matched by the preceding atom
+
+Constraint metrics (comma separated, compared with < <= > >= ==):
+    move   |price - previous pivot price|
+    retr   move / previous leg, i.e. |p0 - p1| / |p1 - p2|
+
+Examples:
+    "HL (HH|LH)+ LL"
+    ". . . LL"            any 3 labels then LL
+    "HH HL[retr<=0.5] HH"
+
+All patterns of a watch are compiled into one NFA that is stepped once per new
+pivot and determinized lazily, so the per-pivot cost is a cached table lookup
+(plus any price constraints that are live) regardless of pattern count.
+"""
+
+import math
+import re
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+LABELS = ("HH", "HL", "LH", "LL")
+_CLASSES = {
+    "HH": frozenset(["HH"]),
+    "HL": frozenset(["HL"]),
+    "LH": frozenset(["LH"]),
+    "LL": frozenset(["LL"]),
+    "H": frozenset(["HH", "LH"]),
+    "L": frozenset(["HL", "LL"]),
+    ".": None,  # any label
+}
+_OPS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "==": lambda a, b: a == b,
+}
+_METRICS = ("move", "retr")
+
+_TOKEN_RE = re.compile(r"\s*(HH|HL|LH|LL|H|L|\.|\(|\)|\||\+|\*|\?|\{\d+(?:,\d*)?\}|\[[^\]]*\])")
+_COND_RE = re.compile(r"^\s*(\w+)\s*(<=|>=|==|<|>)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$")
+
+# A price constraint: ((metric, op, value), ...), all must hold
+Guard = Tuple[Tuple[str, str, float], ...]
+
+
+class PatternSyntaxError(ValueError):
+    """Raised for malformed pattern strings."""
+
+
+# ---------------------------------------------------------------------------
+# Parsing → AST of tuples:
+#   ("atom", labels|None, guard) ("seq", [..]) ("alt", [..]) ("rep", node, lo, hi|None)
+# ---------------------------------------------------------------------------
+
+def _tokenize(src: str) -> List[str]:
+    tokens: List[str] = []
+    pos = 0
+    src = src.rstrip()
+    while pos < len(src):
+        m = _TOKEN_RE.match(src, pos)
+        if m is None:
+            raise PatternSyntaxError(f"Unexpected input at {pos} in pattern {src!r}")
+        tokens.append(m.group(1))
+        pos = m.end()
+    return tokens
+
+
+def _parse_guard(token: str, src: str) -> Guard:
+    conds = []
+    for part in token[1:-1].split(","):
+        m = _COND_RE.match(part)
+        if m is None or m.group(1) not in _METRICS:
+            raise PatternSyntaxError(f"Bad constraint {part.strip()!r} in pattern {src!r}")
+        conds.append((m.group(1), m.group(2), float(m.group(3))))
+    return tuple(conds)
+
+
+class _Parser:
+    def __init__(self, src: str) -> None:
+        self.src = src
+        self.tokens = _tokenize(src)
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> str:
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise PatternSyntaxError("Empty pattern")
+        node = self.alt()
+        if self.peek() is not None:
+            raise PatternSyntaxError(f"Unexpected {self.peek()!r} in pattern {self.src!r}")
+        return node
+
+    def alt(self) -> tuple:
+        branches = [self.seq()]
+        while self.peek() == "|":
+            self.take()
+            branches.append(self.seq())
+        return branches[0] if len(branches) == 1 else ("alt", branches)
+
+    def seq(self) -> tuple:
+        items = []
+        while self.peek() not in (None, "|", ")"):
+            items.append(self.item())
+        if not items:
+            raise PatternSyntaxError(f"Empty branch in pattern {self.src!r}")
+        return items[0] if len(items) == 1 else ("seq", items)
+
+    def item(self) -> tuple:
+        tok = self.take()
+        if tok == "(":
+            node = self.alt()
+            if self.peek() != ")":
+                raise PatternSyntaxError(f"Missing ')' in pattern {self.src!r}")
+            self.take()
+        elif tok in _CLASSES:
+            guard: Guard = ()
+            if (self.peek() or "").startswith("["):
+                guard = _parse_guard(self.take(), self.src)
+            node = ("atom", _CLASSES[tok], guard)
+        else:
+            raise PatternSyntaxError(f"Unexpected {tok!r} in pattern {self.src!r}")
+
+        while self.peek() is not None and self.peek()[0] in "+*?{":
+            q = self.take()
+            if q == "+":
+                node = ("rep", node, 1, None)
+            elif q == "*":
+                node = ("rep", node, 0, None)
+            elif q == "?":
+                node = ("rep", node, 0, 1)
+            else:
+                lo_s, _, hi_s = q[1:-1].partition(",")
+                lo = int(lo_s)
+                hi = lo if "," not in q else (int(hi_s) if hi_s else None)
+                if hi is not None and hi < lo:
+                    raise PatternSyntaxError(f"Bad repetition {q} in pattern {self.src!r}")
+                node = ("rep", node, lo, hi)
+        return node
+
+
+def parse_pattern(src: str) -> tuple:
+    """Parse a pattern string into its AST (raises PatternSyntaxError)."""
+    return _Parser(src).parse()
+
+
+# ---------------------------------------------------------------------------
+# NFA (Thompson construction, built back to front)
+# ---------------------------------------------------------------------------
+
+class _NFA:
+    def __init__(self) -> None:
+        self.eps: List[List[int]] = []
+        # consuming edge per state: (labels|None, guard, target) or None
+        self.edge: List[Optional[Tuple[Optional[FrozenSet[str]], Guard, int]]] = []
+        self.accept: List[Optional[int]] = []
+
+    def new(self) -> int:
+        self.eps.append([])
+        self.edge.append(None)
+        self.accept.append(None)
+        return len(self.eps) - 1
+
+    def build(self, node: tuple, nxt: int) -> int:
+        """Emit states for ``node`` that continue to ``nxt``; return the entry state."""
+        kind = node[0]
+        if kind == "atom":
+            s = self.new()
+            self.edge[s] = (node[1], node[2], nxt)
+            return s
+        if kind == "seq":
+            for child in reversed(node[1]):
+                nxt = self.build(child, nxt)
+            return nxt
+        if kind == "alt":
+            s = self.new()
+            self.eps[s] = [self.build(child, nxt) for child in node[1]]
+            return s
+        # rep
+        _, child, lo, hi = node
+        if hi is None:
+            loop = self.new()
+            self.eps[loop] = [self.build(child, loop), nxt]
+            tail = loop
+        else:
+            tail = nxt
+            for _ in range(hi - lo):
+                opt = self.new()
+                self.eps[opt] = [self.build(child, tail), nxt]
+                tail = opt
+        for _ in range(lo):
+            tail = self.build(child, tail)
+        return tail
+
+    def closure(self, states: Sequence[int]) -> FrozenSet[int]:
+        seen = set(states)
+        todo = list(states)
+        while todo:
+            for t in self.eps[todo.pop()]:
+                if t not in seen:
+                    seen.add(t)
+                    todo.append(t)
+        return frozenset(seen)
+
+
+def _guard_ok(guard: Guard, p0: Optional[float], p1: Optional[float], p2: Optional[float]) -> bool:
+    if p0 is None or p1 is None:
+        return False
+    move = abs(p0 - p1)
+    for metric, op, value in guard:
+        if metric == "move":
+            x = move
+        else:
+            if p2 is None or p1 == p2:
+                return False
+            x = move / abs(p1 - p2)
+        if math.isnan(x) or not _OPS[op](x, value):
+            return False
+    return True
+
+
+class _DState:
+    """Lazily built DFA node: a set of NFA states plus cached transitions."""
+    __slots__ = ("states", "accepts", "moves")
+
+    def __init__(self, states: FrozenSet[int], accepts: Tuple["PatternSpec", ...]) -> None:
+        self.states = states
+        self.accepts = accepts
+        # label -> (guards to evaluate, {guard outcomes: next node})
+        self.moves: Dict[str, Tuple[Tuple[Guard, ...], Dict[Tuple[bool, ...], "_DState"]]] = {}
+
+
+PatternSpec = Union[str, Sequence[str]]
+
+
+class PatternAutomaton:
+    """
+    Incremental matcher for a set of DSL (or exact list) patterns.
+
+    ``advance(label, price)`` consumes one pivot and returns the patterns (as
+    given) whose match ends at it. Exact lists are treated as plain sequences.
+    ``state`` may be saved / restored to rewind; ``clone`` gives an independent
+    matcher sharing the compiled tables.
+    """
+
+    def __init__(self, specs: Sequence[PatternSpec]) -> None:
+        self.patterns: List[PatternSpec] = [s if isinstance(s, str) else list(s) for s in specs]
+        nfa = _NFA()
+        starts: List[int] = []
+        for pid, spec in enumerate(self.patterns):
+            if isinstance(spec, str):
+                ast = parse_pattern(spec)
+            else:
+                if not spec or any(lab not in LABELS for lab in spec):
+                    raise PatternSyntaxError(f"Bad label list {spec!r} (use {', '.join(LABELS)})")
+                ast = ("seq", [("atom", _CLASSES[lab], ()) for lab in spec])
+            acc = nfa.new()
+            nfa.accept[acc] = pid
+            start = nfa.build(ast, acc)
+            if acc in nfa.closure([start]):
+                raise PatternSyntaxError(f"Pattern {spec!r} can match an empty sequence")
+            starts.append(start)
+        self._nfa = nfa
+        self._start = nfa.closure(starts)
+        self._nodes: Dict[FrozenSet[int], _DState] = {}
+        self._root = self._node(self._start)
+        self.reset()
+
+    def _node(self, states: FrozenSet[int]) -> _DState:
+        node = self._nodes.get(states)
+        if node is None:
+            ids = sorted(self._nfa.accept[s] for s in states if self._nfa.accept[s] is not None)
+            node = self._nodes[states] = _DState(states, tuple(self.patterns[pid] for pid in ids))
+        return node
+
+    def _live_edges(self, node: _DState, label: str) -> List[Tuple[Guard, int]]:
+        edges = []
+        for s in sorted(node.states):
+            edge = self._nfa.edge[s]
+            if edge is not None and (edge[0] is None or label in edge[0]):
+                edges.append((edge[1], edge[2]))
+        return edges
+
+    def reset(self) -> None:
+        self._cur = self._root
+        self._prices: Tuple[Optional[float], Optional[float]] = (None, None)
+
+    @property
+    def state(self) -> Tuple[_DState, Tuple[Optional[float], Optional[float]]]:
+        return self._cur, self._prices
+
+    @state.setter
+    def state(self, value: Tuple[_DState, Tuple[Optional[float], Optional[float]]]) -> None:
+        self._cur, self._prices = value
+
+    def clone(self) -> "PatternAutomaton":
+        twin = object.__new__(PatternAutomaton)
+        twin.__dict__.update(self.__dict__)
+        twin.reset()
+        return twin
+
+    def advance(self, label: str, price: Optional[float] = None) -> Tuple[PatternSpec, ...]:
+        """Consume one pivot label (and its price for constraints)."""
+        node = self._cur
+        move = node.moves.get(label)
+        if move is None:
+            edges = self._live_edges(node, label)
+            guards = tuple(g for g, _ in edges if g)
+            move = node.moves[label] = (guards, {})
+        guards, table = move
+
+        p1, p2 = self._prices
+        key = tuple(_guard_ok(g, price, p1, p2) for g in guards)
+        nxt = table.get(key)
+        if nxt is None:
+            outcome = iter(key)
+            targets = [t for g, t in self._live_edges(node, label) if not g or next(outcome)]
+            nxt = table[key] = self._node(self._nfa.closure(targets) | self._start)
+        self._cur = nxt
+        self._prices = (price, p1)
+        return nxt.accepts
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared scheduler that drives many watches over a single MT5 session.
+"""
+
+import calendar
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import metrics
+from core.config.config import AppConfig, WatchConfig
+from core.mt5.connection import (
+    TIMEFRAME_SECONDS, get_new_ticks, get_server_time_offset, select_symbol, timeframe_to_mt5,
+)
+from core.orchestrator import (
+    bars_changed, fetch_rates, group_key, process_group, process_once, process_ticks, publish_alerts, symbol_point,
+)
+from core.parallel import WatchPool
+from core.webhook.dedup import AlertDedup
+from core.webhook.sender import WebhookDispatcher
+
+# Epoch day 0 is a Thursday; MT5 weekly bars open on Sunday
+_WEEK_ANCHOR = 3 * 86400
+
+# Re-estimate the broker offset this often (DST switches)
+SERVER_OFFSET_REFRESH_SEC = 3600
+# ...and this often while no symbol has a fresh tick
+SERVER_OFFSET_RETRY_SEC = 300
+
+# AppConfig fields read once at start-up (connection, workers, stores); a
+# reload that changes them keeps the running values until a restart
+RESTART_FIELDS = (
+    "data_source", "data_source_options", "mt5_login", "mt5_password", "mt5_server",
+    "mt5_health_check_sec", "mt5_reconnect_backoff_sec", "mt5_reconnect_backoff_max_sec",
+    "execution_mode", "execution_workers", "dedup_max_entries", "dedup_ttl_sec", "dedup_path",
+    "history_dir", "resample_timeframes", "resample_max_age_sec", "metrics_enabled", "metrics_host",
+    "metrics_port", "metrics_log_interval_sec", "webhook_queue_size", "webhook_max_retries",
+    "webhook_backoff_sec", "webhook_backoff_max_sec", "webhook_timeout_sec", "webhook_spool_dir",
+    "webhook_spool_rescan_sec", "reload_interval_sec",
+)
+
+# Fields after whose change every watch is rescheduled at once
+_SCHEDULE_FIELDS = ("schedule_mode", "poll_interval_sec", "close_delay_ms", "server_offset_sec")
+
+
+def next_bar_open(tf: str, t: float) -> float:
+    """
+    Epoch time of the first bar boundary of timeframe ``tf`` strictly after ``t``.
+    """
+    tf = tf.upper().strip()
+    if tf == "MN1":
+        d = datetime.fromtimestamp(t, tz=timezone.utc)
+        year, month = (d.year + 1, 1) if d.month == 12 else (d.year, d.month + 1)
+        return float(calendar.timegm((year, month, 1, 0, 0, 0)))
+    if tf not in TIMEFRAME_SECONDS:
+        raise ValueError(f"Unsupported timeframe: {tf}")
+    period = TIMEFRAME_SECONDS[tf]
+    anchor = _WEEK_ANCHOR if tf == "W1" else 0
+    return float(((int(t) - anchor) // period + 1) * period + anchor)
+
+
+def _state_key(w: WatchConfig) -> Tuple[Any, ...]:
+    """Everything the bars / zigzag state of a watch depends on (all but its patterns)."""
+    return w.symbol, w.timeframe, w.bars_to_fetch, w.zz_params, w.zz_backend
+
+
+@dataclass
+class ScheduledWatch:
+    """A watch plus its private runtime state."""
+    config: WatchConfig
+    tf_const: int
+    # Unique per watch for this run (worker pool key)
+    uid: str = ""
+    state: Dict[str, Any] = field(default_factory=dict)
+    next_due: float = 0.0
+    # Server-time open of the bar expected after the last close, and the local
+    # time until which to fast-poll for it
+    expected_open: Optional[float] = None
+    fast_poll_until: float = 0.0
+
+
+class Scheduler:
+    """
+    Poll every configured watch on one MT5 connection.
+
+    In "bar_close" mode a watch is polled once at start-up and then just after
+    each close of its timeframe (broker server time), so H4/D1 watches stay idle
+    between bars while M1 watches run every minute. With a fast-poll window, a
+    watch whose new bar has not appeared yet is re-polled every
+    ``fast_poll_interval_ms`` until it does or the window ends.
+
+    In "interval" mode every watch is polled every ``poll_interval_sec``.
+
+    With ``execution_mode: process`` the due watches are fetched here and
+    their compute runs concurrently on a ``WatchPool``; dedup and publishing
+    stay in this process.
+
+    With ``tick_mode`` every ``tick_poll_ms`` the new ticks of each symbol are
+    fed to its watches (``process_ticks``) for provisional alerts between
+    bar cycles.
+
+    ``apply_config`` switches to a reloaded config in place, keeping the warm
+    state of every watch that is still configured.
+    """
+
+    def __init__(self, cfg: AppConfig, dispatcher: Optional[WebhookDispatcher] = None) -> None:
+        self.cfg = cfg
+        self.dispatcher = dispatcher
+        # One dedup store for all watches (fingerprints carry symbol, timeframe
+        # and zigzag settings, so watches never suppress each other's alerts)
+        self.alerts = AlertDedup(cfg.dedup_max_entries, cfg.dedup_ttl_sec, cfg.dedup_path)
+        self._uids = itertools.count()
+        self.watches: List[ScheduledWatch] = [self._new_watch(w) for w in cfg.watches]
+        self.pool = WatchPool(cfg.execution_workers or None) if cfg.execution_mode == "process" else None
+        self.server_offset = cfg.server_offset_sec or 0
+        self._offset_checked = 0.0
+        self._by_symbol: Dict[str, List[ScheduledWatch]] = {}
+        self._index()
+        self._ticks_due = 0.0
+
+    def _new_watch(self, w: WatchConfig) -> ScheduledWatch:
+        return ScheduledWatch(config=w, tf_const=timeframe_to_mt5(w.timeframe), uid=f"{w.name} #{next(self._uids)}",
+                              state={"alerts": self.alerts})
+
+    def _index(self) -> None:
+        self._by_symbol = {}
+        for sw in self.watches:
+            self._by_symbol.setdefault(sw.config.symbol, []).append(sw)
+
+    def apply_config(self, cfg: AppConfig, now: Optional[float] = None) -> bool:
+        """
+        Switch to a reloaded ``cfg`` without a restart.
+
+        Watches are matched on symbol, timeframe, bars_to_fetch and zigzag
+        params / backend. A matched watch keeps its state (bars, zigzag,
+        pattern stream) and schedule; if only its patterns changed, just the
+        stream is dropped and the watch runs on the next ``run_due``, which
+        replays the kept pivots through the new matcher and alerts only on the
+        newest one, as at start-up. Other watches start cold; the dedup store
+        is shared by all. Webhook destinations switch at once;
+        ``RESTART_FIELDS`` keep their running values.
+
+        Returns False (config unchanged) if a new symbol cannot be selected.
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        old = self.cfg
+        pinned = [f for f in RESTART_FIELDS if getattr(cfg, f) != getattr(old, f)]
+        if pinned:
+            logging.warning("Config reload: %s need a restart, keeping the running values", ", ".join(pinned))
+            cfg = replace(cfg, **{f: getattr(old, f) for f in pinned})
+        if cfg.tick_mode and self.pool is not None:
+            logging.warning("Config reload: ticks.enabled needs execution.mode: serial, ignored")
+            cfg = replace(cfg, tick_mode=False)
+
+        for symbol in sorted({w.symbol for w in cfg.watches} - set(self._by_symbol)):
+            if not select_symbol(symbol):
+                logging.error("Config reload rejected: cannot select symbol %s", symbol)
+                metrics.inc("config_reloads_total", result="rejected")
+                return False
+
+        # Plan the new watch list first: nothing running changes if this raises
+        current: Dict[Tuple[Any, ...], List[ScheduledWatch]] = {}
+        for sw in self.watches:
+            current.setdefault(_state_key(sw.config), []).append(sw)
+        plan: List[Tuple[ScheduledWatch, WatchConfig]] = []
+        added = 0
+        for w in cfg.watches:
+            matches = current.get(_state_key(w))
+            if matches:
+                plan.append((matches.pop(0), w))
+            else:
+                plan.append((self._new_watch(w), w))
+                added += 1
+        removed = [sw for rest in current.values() for sw in rest]
+
+        repatterned = 0
+        for sw, w in plan:
+            if sw.config is not w and w.patterns != sw.config.patterns:
+                sw.state.pop("stream", None)
+                sw.state.pop("probe", None)  # run even if no bar closed
+                sw.next_due = min(sw.next_due, now)
+                if self.pool is not None:
+                    self.pool.forget(sw.uid)
+                repatterned += 1
+            sw.config = w
+        watches = [sw for sw, _ in plan]
+        if self.pool is not None:
+            for sw in removed:
+                self.pool.forget(sw.uid, release=True)
+
+        if any(getattr(cfg, f) != getattr(old, f) for f in _SCHEDULE_FIELDS):
+            for sw in watches:
+                sw.next_due = min(sw.next_due, now)
+                sw.expected_open = None
+            self.server_offset = cfg.server_offset_sec or 0
+            self._offset_checked = 0.0
+        if self.dispatcher is not None and cfg.webhooks != old.webhooks:
+            self.dispatcher.set_destinations(cfg.webhooks)
+
+        self.cfg = cfg
+        self.watches = watches
+        self._index()
+        metrics.inc("config_reloads_total", result="ok")
+        logging.info("Config reloaded in %.1f ms: %d watches (%d new, %d new patterns, %d removed)",
+                     (time.perf_counter() - started) * 1000, len(watches), added, repatterned, len(removed))
+        return True
+
+    def _refresh_server_offset(self, now: float) -> None:
+        if self.cfg.server_offset_sec is not None or not self.watches:
+            return
+        if now - self._offset_checked < SERVER_OFFSET_REFRESH_SEC:
+            return
+        self._offset_checked = now
+        try:
+            offset = get_server_time_offset([sw.config.symbol for sw in self.watches])
+        except Exception as exc:  # pragma: no cover - runtime robustness
+            logging.warning("Server time offset check failed: %s", exc)
+            return
+        if offset is None:
+            # No fresh tick (market closed): keep the last offset, look again soon
+            self._offset_checked = now - SERVER_OFFSET_REFRESH_SEC + SERVER_OFFSET_RETRY_SEC
+            return
+        if offset != self.server_offset:
+            logging.info("Broker server time offset: %+d s", offset)
+            self.server_offset = offset
+
+    def _schedule_next(self, sw: ScheduledWatch, now: float) -> None:
+        if self.cfg.schedule_mode == "interval":
+            sw.next_due = now + self.cfg.poll_interval_sec
+            return
+
+        if (sw.expected_open is not None and now < sw.fast_poll_until
+                and sw.state.get("last_bar_time", 0) < sw.expected_open):
+            # Close passed but the terminal has not produced the new bar yet
+            sw.next_due = now + self.cfg.fast_poll_interval_ms / 1000.0
+            return
+
+        offset = self.server_offset
+        close_server = next_bar_open(sw.config.timeframe, now + offset)
+        sw.expected_open = close_server
+        sw.next_due = close_server - offset + self.cfg.close_delay_ms / 1000.0
+        sw.fast_poll_until = close_server - offset + self.cfg.fast_poll_window_ms / 1000.0
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Run every watch whose next poll is due. Returns the number polled."""
+        now = time.time() if now is None else now
+        if self.cfg.schedule_mode == "bar_close":
+            self._refresh_server_offset(now)
+        if self.cfg.tick_mode and now >= self._ticks_due:
+            self._ticks_due = now + self.cfg.tick_poll_ms / 1000.0
+            self._run_ticks()
+        if self.pool is not None:
+            return self._run_pool(now)
+        # Due watches that only differ in zigzag params run as one group
+        groups: Dict[Any, List[ScheduledWatch]] = {}
+        for sw in self.watches:
+            if sw.next_due <= now:
+                key = group_key(sw.config)
+                groups.setdefault(key if key is not None else id(sw), []).append(sw)
+        polled = 0
+        for group in groups.values():
+            try:
+                if len(group) == 1:
+                    sw = group[0]
+                    process_once(self.cfg, sw.config, sw.tf_const, sw.state, self.dispatcher)
+                else:
+                    process_group(self.cfg, [(sw.config, sw.state) for sw in group], group[0].tf_const,
+                                  self.dispatcher)
+                for sw in group:
+                    self._schedule_next(sw, now)
+            except Exception as exc:  # pragma: no cover - runtime robustness
+                logging.exception("Error in process_once [%s]: %s", group[0].config.name, exc)
+                for sw in group:
+                    sw.next_due = now + self.cfg.poll_interval_sec
+            polled += len(group)
+        return polled
+
+    def _run_ticks(self) -> None:
+        """Feed each symbol's new ticks to its watches."""
+        for symbol, watches in self._by_symbol.items():
+            try:
+                ticks = get_new_ticks(symbol)
+            except Exception as exc:  # pragma: no cover - runtime robustness
+                logging.warning("Tick fetch failed [%s]: %s", symbol, exc)
+                continue
+            if not len(ticks):
+                continue
+            for sw in watches:
+                try:
+                    process_ticks(self.cfg, sw.config, sw.state, ticks, self.dispatcher)
+                except Exception as exc:  # pragma: no cover - runtime robustness
+                    logging.exception("Error in process_ticks [%s]: %s", sw.config.name, exc)
+
+    def _run_pool(self, now: float) -> int:
+        """Fetch every due watch, compute them in parallel, then publish."""
+        cfg = self.cfg
+        jobs = []
+        polled = 0
+        with metrics.timer("pool_round"):
+            for sw in self.watches:
+                if sw.next_due > now:
+                    continue
+                polled += 1
+                try:
+                    if cfg.skip_unchanged_bars and not bars_changed(sw.config, sw.tf_const, sw.state):
+                        sw.state["skipped_cycles"] = sw.state.get("skipped_cycles", 0) + 1
+                        metrics.inc("cycles_skipped_total")
+                        self._schedule_next(sw, now)
+                        continue
+                    point = symbol_point(sw.config, sw.state)
+                    rates = fetch_rates(sw.config, sw.tf_const, sw.state)
+                    jobs.append((sw, self.pool.submit(sw.uid, sw.config, rates, point)))
+                except Exception as exc:  # pragma: no cover - runtime robustness
+                    logging.exception("Error fetching [%s]: %s", sw.config.name, exc)
+                    sw.next_due = now + cfg.poll_interval_sec
+
+            for sw, fut in jobs:
+                try:
+                    alerts = fut.result()
+                    sw.state["probe"] = sw.state.pop("probe_pending", None)
+                    publish_alerts(cfg, sw.config, sw.state, alerts, self.dispatcher)
+                    self._schedule_next(sw, now)
+                except Exception as exc:  # pragma: no cover - runtime robustness
+                    logging.exception("Error in worker [%s]: %s", sw.config.name, exc)
+                    sw.next_due = now + cfg.poll_interval_sec
+        return polled
+
+    def close(self) -> None:
+        """Stop the worker pool and close the dedup store."""
+        if self.pool is not None:
+            self.pool.close()
+        self.alerts.close()
+
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """Time until the earliest due watch (or tick poll), capped at poll_interval_sec."""
+        now = time.time() if now is None else now
+        if not self.watches:
+            return float(self.cfg.poll_interval_sec)
+        earliest = min(sw.next_due for sw in self.watches)
+        if self.cfg.tick_mode:
+            earliest = min(earliest, self._ticks_due)
+        return max(0.0, min(earliest - now, float(self.cfg.poll_interval_sec)))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bounded, time-expiring store of alerts already sent, optionally persisted so
+a restart does not resend them.
+
+Fingerprints are hashed to 64-bit keys; entries are evicted oldest-first once
+older than ``ttl_sec`` or beyond ``max_entries``. Persistence is chosen by the
+file name: ``*.sqlite`` / ``*.db`` use SQLite, anything else an append-only
+text log that is compacted on load.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def alert_key(fingerprint: Tuple[Any, ...]) -> int:
+    """Stable signed 64-bit key of a fingerprint tuple (str / int items)."""
+    digest = hashlib.blake2b(repr(fingerprint).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class AlertDedup:
+    """
+    ``fingerprint in store`` / ``store.add(fingerprint)`` with LRU + TTL eviction.
+
+    Args:
+        max_entries: keys kept (oldest evicted first)
+        ttl_sec: forget keys older than this (0 = never)
+        path: persist keys here (SQLite or append-only log), None = memory only
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl_sec: float = 3 * 86400, path: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.path = path
+        self._keys: "OrderedDict[int, float]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._log = None
+        if path:
+            if path.endswith(SQLITE_SUFFIXES):
+                self._open_sqlite(path)
+            else:
+                self._open_log(path)
+            logging.info("Alert dedup: %d key(s) loaded from %s", len(self._keys), path)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, fingerprint: Tuple[Any, ...]) -> bool:
+        ts = self._keys.get(alert_key(fingerprint))
+        return ts is not None and not self._expired(ts, time.time())
+
+    def add(self, fingerprint: Tuple[Any, ...], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        key = alert_key(fingerprint)
+        self._keys.pop(key, None)
+        self._keys[key] = now
+        self._evict(now)
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO alerts (key, ts) VALUES (?, ?)", (key, now))
+            self._db.commit()
+        elif self._log is not None:
+            self._log.write(f"{key} {now:.0f}\n")
+            self._log.flush()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _expired(self, ts: float, now: float) -> bool:
+        return self.ttl_sec > 0 and ts < now - self.ttl_sec
+
+    def _evict(self, now: float) -> None:
+        keys = self._keys
+        while keys and (len(keys) > self.max_entries or self._expired(next(iter(keys.values())), now)):
+            keys.popitem(last=False)
+
+    def _load(self, entries: Dict[int, float]) -> None:
+        for key, ts in sorted(entries.items(), key=lambda kv: kv[1]):
+            self._keys[key] = ts
+        self._evict(time.time())
+
+    def _open_sqlite(self, path: str) -> None:
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS alerts (key INTEGER PRIMARY KEY, ts REAL NOT NULL)")
+        self._load(dict(self._db.execute(
+            "SELECT key, ts FROM alerts ORDER BY ts DESC LIMIT ?", (self.max_entries,))))
+        oldest = next(iter(self._keys.values()), time.time())
+        self._db.execute("DELETE FROM alerts WHERE ts < ?", (oldest,))
+        self._db.commit()
+
+    def _open_log(self, path: str) -> None:
+        entries: Dict[int, float] = {}
+        lines = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue  # torn last line
+                    try:
+                        entries[int(parts[0])] = float(parts[1])
+                    except ValueError:
+                        continue
+                    lines += 1
+        self._load(entries)
+        if lines > 2 * len(self._keys) + 100:
+            # Rewrite without evicted / repeated keys
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(f"{key} {ts:.0f}\n" for key, ts in self._keys.items())
+            os.replace(tmp, path)
+        self._log = open(path, "a", encoding="utf-8")
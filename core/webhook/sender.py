@@ -5,26 +5,45 @@
 Webhook functionality for sending alerts.
 """
 
+import itertools
 import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 import requests
 
-from core.zigzag.calculator import Pivot
+from core import metrics
+from core.config.config import WebhookConfig
+from core.zigzag.calculator import Pivot, PivotSeries
 
 
-def send_webhook(url: str, payload: Dict[str, Any]) -> Tuple[bool, str]:
+def send_webhook(
+    url: str,
+    payload: Union[Dict[str, Any], List[Dict[str, Any]]],
+    session: Optional[requests.Session] = None,
+    timeout: float = 10,
+) -> Tuple[bool, str]:
     """
-    POST JSON to a webhook URL.
+    POST JSON (one alert, or a JSON array batch) to a webhook URL, through
+    ``session`` when given for keep-alive.
     """
     try:
         headers = {"Content-Type": "application/json"}
-        resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=10)
+        with metrics.timer("webhook_post"):
+            resp = (session or requests).post(url, headers=headers, data=json.dumps(payload), timeout=timeout)
         if 200 <= resp.status_code < 300:
+            metrics.inc("webhook_requests_total", result="ok")
             return True, f"Webhook OK: {resp.status_code}"
+        metrics.inc("webhook_requests_total", result="failed")
         return False, f"Webhook Failed: {resp.status_code} - {resp.text[:200]}"
     except Exception as exc:
+        metrics.inc("webhook_requests_total", result="error")
         return False, f"Webhook Error: {exc}"
 
 
@@ -33,21 +52,27 @@ def build_payload(
     timeframe_str: str,
     matched_pattern: List[str],
     buffer_snapshot: List[str],
-    pivots: List[Pivot],
+    pivots: Union[PivotSeries, List[Pivot]],
     last_close: float,
+    stage: str = "confirmed",
 ) -> Dict[str, Any]:
     """
-    Construct alert payload with context.
+    Construct alert payload with context. Only the last 10 pivots are turned
+    into objects / ISO times.
+
+    ``stage`` is "confirmed" for pivots fixed by the bar cycle, or
+    "provisional" when the newest pivot is still forming (tick mode).
     """
     last_pivots = [{
         "index": p.index,
-        "time_utc": p.time.replace(tzinfo=timezone.utc).isoformat(),
+        "time_utc": p.time_iso,
         "price": p.price,
         "kind": p.kind,
     } for p in pivots[-10:]]
 
     return {
         "event": "zigzag_pattern_detected",
+        "stage": stage,
         "symbol": symbol,
         "timeframe": timeframe_str,
         "matched_pattern": matched_pattern,
@@ -56,3 +81,310 @@ def build_payload(
         "pivots_tail": last_pivots,
         "ts_utc": datetime.now(timezone.utc).isoformat(),
     }
+
+
+class _RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across threads."""
+
+    def __init__(self, rate_per_sec: float) -> None:
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, stop: threading.Event) -> bool:
+        """Block until the next slot; returns False if ``stop`` was set meanwhile."""
+        if not self.interval:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        return not stop.wait(slot - now) if slot > now else True
+
+
+# Queue item: (payload, spool path)
+_Item = Tuple[Dict[str, Any], Optional[str]]
+
+
+class _Lane:
+    """Queue, workers and rate limit for one destination URL."""
+
+    def __init__(self, dest: WebhookConfig, max_queue: int) -> None:
+        self.dest = dest
+        self.queue: "queue.Queue[_Item]" = queue.Queue(maxsize=max_queue)
+        self.limiter = _RateLimiter(dest.rate_per_sec)
+        self.threads: List[threading.Thread] = []
+
+    def next_batch(self, stop: threading.Event) -> List[_Item]:
+        """Wait for one alert, then coalesce more for up to batch_window_ms / batch_max."""
+        while not stop.is_set():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+                break
+            except queue.Empty:
+                continue
+        else:
+            return []
+        window = self.dest.batch_window_ms / 1000.0
+        if window > 0:
+            deadline = time.monotonic() + window
+            while len(batch) < self.dest.batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+
+class WebhookDispatcher:
+    """
+    Background webhook delivery with batching, routing and per-destination limits.
+
+    ``publish`` routes an alert to every destination whose symbol/pattern filter
+    accepts it and returns immediately. Each destination has its own bounded
+    queue, ``concurrency`` worker threads and rate limit; with
+    ``batch_window_ms`` set, alerts arriving within the window (up to
+    ``batch_max``) are coalesced into one JSON array request. Workers share one
+    pooled ``requests.Session`` (keep-alive) and retry failures with jittered
+    exponential backoff. With ``spool_dir`` set, every alert is written to disk
+    until delivered, so alerts still pending at shutdown or after a crash are
+    re-sent on the next start; while running, the spool is re-scanned every
+    ``spool_rescan_sec`` for alerts that did not fit a full queue or ran out of
+    retries.
+    """
+
+    def __init__(
+        self,
+        destinations: Optional[List[WebhookConfig]] = None,
+        max_queue: int = 1000,
+        max_retries: int = 5,
+        backoff_sec: float = 1.0,
+        backoff_max_sec: float = 60.0,
+        timeout_sec: float = 10.0,
+        spool_dir: Optional[str] = None,
+        spool_rescan_sec: float = 30.0,
+    ) -> None:
+        self.destinations = list(destinations or [])
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.backoff_max_sec = backoff_max_sec
+        self.timeout_sec = timeout_sec
+        self.spool_dir = spool_dir
+        self.spool_rescan_sec = spool_rescan_sec
+        self._lanes: Dict[str, _Lane] = {d.url: _Lane(d, max_queue) for d in self.destinations}
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._started = False
+        self._seq = itertools.count()
+        # Spool files currently queued or being sent (not to be queued twice)
+        self._queued: Set[str] = set()
+        self._spool_lock = threading.Lock()
+        self._rescanner: Optional[threading.Thread] = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self._load_spool()
+
+    def _lane(self, url: str) -> _Lane:
+        lane = self._lanes.get(url)
+        if lane is None:
+            # Unrouted URL (direct enqueue or an old spool entry): default limits
+            lane = self._lanes[url] = _Lane(WebhookConfig(url=url), self.max_queue)
+            if self._started:
+                self._start_lane(lane)
+        return lane
+
+    def _load_spool(self) -> int:
+        """Queue spooled alerts that are not queued yet. Returns how many were queued."""
+        loaded = 0
+        with self._spool_lock:
+            for path in self._spooled():
+                if path in self._queued:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        item = json.load(f)
+                    self._lane(item["url"]).queue.put_nowait((item["payload"], path))
+                except queue.Full:
+                    continue
+                except FileNotFoundError:  # pragma: no cover - delivered meanwhile
+                    continue
+                except Exception as exc:  # pragma: no cover - corrupt spool file
+                    logging.warning("Skipping spool file %s: %s", path, exc)
+                    continue
+                self._queued.add(path)
+                loaded += 1
+        return loaded
+
+    def _rescan(self) -> None:
+        while not self._stop.wait(self.spool_rescan_sec):
+            loaded = self._load_spool()
+            if loaded:
+                logging.info("Re-queued %d spooled alert(s)", loaded)
+                metrics.set_gauge("webhook_queue_depth", self.queue_depth())
+
+    def start(self) -> None:
+        """Start the delivery worker threads."""
+        if self._started:
+            return
+        self._stop.clear()
+        self._started = True
+        for lane in list(self._lanes.values()):
+            self._start_lane(lane)
+        if self.spool_dir and self.spool_rescan_sec > 0:
+            self._rescanner = threading.Thread(target=self._rescan, name="webhook-spool", daemon=True)
+            self._rescanner.start()
+
+    def _start_lane(self, lane: _Lane) -> None:
+        # Only the workers it is missing (a reload may raise concurrency)
+        for k in range(len(lane.threads), max(1, lane.dest.concurrency)):
+            t = threading.Thread(target=self._run, args=(lane,), name=f"webhook-{k}", daemon=True)
+            t.start()
+            lane.threads.append(t)
+
+    def set_destinations(self, destinations: List[WebhookConfig]) -> None:
+        """
+        Route new alerts to ``destinations`` (config reload). Lanes of removed
+        URLs keep draining what they already queued; kept URLs take the new
+        filter, batching and rate limit, and grow to a higher ``concurrency``.
+        """
+        for dest in destinations:
+            lane = self._lanes.get(dest.url)
+            if lane is None:
+                lane = self._lanes[dest.url] = _Lane(dest, self.max_queue)
+                if self._started:
+                    self._start_lane(lane)
+                continue
+            if dest.rate_per_sec != lane.dest.rate_per_sec:
+                lane.limiter = _RateLimiter(dest.rate_per_sec)
+            lane.dest = dest
+            if self._started:
+                self._start_lane(lane)
+        self.destinations = list(destinations)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop after draining what can be sent within ``timeout``; the rest stays spooled."""
+        if not self._started:
+            return
+        deadline = time.monotonic() + timeout
+        while (any(lane.queue.unfinished_tasks for lane in self._lanes.values())
+               and time.monotonic() < deadline):
+            time.sleep(0.05)
+        self._stop.set()
+        for lane in self._lanes.values():
+            for t in lane.threads:
+                t.join(max(0.0, deadline - time.monotonic()))
+            lane.threads.clear()
+        if self._rescanner is not None:
+            self._rescanner.join(max(0.0, deadline - time.monotonic()))
+            self._rescanner = None
+        self._started = False
+        self._session.close()
+
+    def queue_depth(self) -> int:
+        return sum(lane.queue.qsize() for lane in self._lanes.values())
+
+    def route(self, payload: Dict[str, Any]) -> List[str]:
+        """
+        URLs of the destinations that accept this alert, each once: destinations
+        sharing a URL share one lane (the last one's limits), so an alert
+        accepted by several of them is still posted once.
+        """
+        return list(dict.fromkeys(
+            d.url for d in self.destinations
+            if d.accepts(payload.get("symbol", ""), payload.get("matched_pattern", []))))
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        """Queue one alert for every matching destination. Returns how many accepted it."""
+        urls = self.route(payload)
+        if not urls:
+            logging.warning("No webhook destination for %s %s",
+                            payload.get("symbol"), payload.get("matched_pattern"))
+        return sum(self.enqueue(url, payload) for url in urls)
+
+    def enqueue(self, url: str, payload: Dict[str, Any]) -> bool:
+        """Queue one alert for ``url`` without blocking. Returns False if it had to be dropped."""
+        # Locked so a spool re-scan cannot queue the file a second time
+        with self._spool_lock:
+            path = self._spool(url, payload)
+            try:
+                self._lane(url).queue.put_nowait((payload, path))
+                queued = True
+            except queue.Full:
+                queued = False
+            if queued and path:
+                self._queued.add(path)
+        if not queued:
+            metrics.inc("alerts_dropped_total")
+            if path:
+                logging.warning("Webhook queue full, alert kept in spool: %s", path)
+            else:
+                logging.warning("Webhook queue full, alert dropped")
+            return False
+        metrics.set_gauge("webhook_queue_depth", self.queue_depth())
+        return True
+
+    def _spooled(self) -> List[str]:
+        if not self.spool_dir:
+            return []
+        names = sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".json"))
+        return [os.path.join(self.spool_dir, n) for n in names]
+
+    def _spool(self, url: str, payload: Dict[str, Any]) -> Optional[str]:
+        if not self.spool_dir:
+            return None
+        path = os.path.join(self.spool_dir, f"{time.time_ns():020d}-{next(self._seq):06d}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "payload": payload}, f)
+        os.replace(tmp, path)
+        return path
+
+    def _run(self, lane: _Lane) -> None:
+        while not self._stop.is_set():
+            batch = lane.next_batch(self._stop)
+            if not batch:
+                continue
+            try:
+                if lane.limiter.wait(self._stop):
+                    self._deliver(lane, batch)
+            finally:
+                with self._spool_lock:
+                    # Undelivered files stay on disk for the next re-scan
+                    self._queued.difference_update(path for _, path in batch if path)
+                for _ in batch:
+                    lane.queue.task_done()
+                metrics.set_gauge("webhook_queue_depth", self.queue_depth())
+
+    def _deliver(self, lane: _Lane, batch: List[_Item]) -> None:
+        url = lane.dest.url
+        if lane.dest.batch_window_ms > 0:
+            body: Union[Dict[str, Any], List[Dict[str, Any]]] = [payload for payload, _ in batch]
+        else:
+            body = batch[0][0]
+        for attempt in range(self.max_retries + 1):
+            ok, msg = send_webhook(url, body, session=self._session, timeout=self.timeout_sec)
+            if ok:
+                metrics.inc("alerts_sent_total", len(batch))
+                logging.info("Alert sent (OK, %d alert(s)): %s", len(batch), msg)
+                for _, path in batch:
+                    if path:
+                        try:
+                            os.remove(path)
+                        except OSError:  # pragma: no cover - already gone
+                            pass
+                return
+            if attempt == self.max_retries or self._stop.is_set():
+                break
+            delay = min(self.backoff_max_sec, self.backoff_sec * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+            logging.warning("Alert sent (FAIL): %s, retry %d in %.1fs", msg, attempt + 1, delay)
+            # Retries take a rate slot like any other request
+            if self._stop.wait(delay) or not lane.limiter.wait(self._stop):
+                break
+        metrics.inc("alerts_failed_total", len(batch))
+        logging.warning("%d alert(s) undelivered after %d attempts%s", len(batch), attempt + 1,
+                        ", kept in spool" if self.spool_dir else "")
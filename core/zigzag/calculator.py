@@ -7,31 +7,259 @@ ZigZag calculation module for technical analysis.
 
 from __future__ import annotations
 
+from array import array
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Iterable, List
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
 
-@dataclass
+def _epoch(t: Any) -> int:
+    """Epoch seconds of an int, datetime / Timestamp (naive = UTC) or datetime64."""
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    if isinstance(t, np.datetime64):
+        return int(t.astype("datetime64[s]").astype(np.int64))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp())
+
+
+def _epochs(times: Iterable[Any]) -> np.ndarray:
+    """Vectorized ``_epoch`` over a Series / array / list of bar times."""
+    if isinstance(times, (pd.Series, pd.Index)):
+        # No np.asarray here: a tz-aware column would become one Timestamp object per bar
+        if times.dtype.kind in "iu":
+            return times.to_numpy(dtype=np.int64)
+        idx = pd.DatetimeIndex(times)
+    else:
+        arr = np.asarray(times)
+        if arr.dtype.kind in "iu":
+            return arr.astype(np.int64)
+        idx = pd.DatetimeIndex(arr)
+    if idx.tz is not None:
+        idx = idx.tz_convert(None)
+    return idx.values.astype("datetime64[s]").astype(np.int64)
+
+
 class Pivot:
-    """A ZigZag pivot."""
-    index: int
-    price: float
-    kind: str  # 'H' or 'L'
-    time: datetime
+    """
+    A ZigZag pivot. The bar time is kept as epoch seconds (``epoch``);
+    ``time`` / ``time_iso`` convert it on access.
+    """
+
+    __slots__ = ("index", "price", "kind", "epoch")
+
+    def __init__(self, index: int, price: float, kind: str, time: Any) -> None:
+        self.index = index
+        self.price = price
+        self.kind = kind  # 'H' or 'L'
+        self.epoch = time if type(time) is int else _epoch(time)
+
+    @property
+    def time(self) -> datetime:
+        """Bar time as a tz-aware UTC datetime."""
+        return datetime.fromtimestamp(self.epoch, tz=timezone.utc)
+
+    @property
+    def time_iso(self) -> str:
+        return self.time.isoformat()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Pivot):
+            return NotImplemented
+        return (self.index, self.price, self.kind, self.epoch) == (other.index, other.price, other.kind, other.epoch)
+
+    def __repr__(self) -> str:
+        return f"Pivot(index={self.index}, price={self.price}, kind={self.kind!r}, time={self.time_iso})"
+
+
+class PivotSeries:
+    """
+    Chronological pivots stored column-wise in typed arrays (int64 index and
+    epoch time, float64 price, int8 kind: +1 = 'H', -1 = 'L'), about 25 bytes
+    per pivot. ``series[k]`` builds a ``Pivot`` on access; a slice returns a
+    list of them.
+    """
+
+    __slots__ = ("index", "price", "kind", "time")
+
+    def __init__(self) -> None:
+        self.index = array("q")
+        self.price = array("d")
+        self.kind = array("b")
+        self.time = array("q")
+
+    @classmethod
+    def from_arrays(cls, index: np.ndarray, price: np.ndarray, kind: np.ndarray, time: np.ndarray) -> "PivotSeries":
+        series = cls()
+        series.index.frombytes(np.ascontiguousarray(index, dtype=np.int64).tobytes())
+        series.price.frombytes(np.ascontiguousarray(price, dtype=np.float64).tobytes())
+        series.kind.frombytes(np.ascontiguousarray(kind, dtype=np.int8).tobytes())
+        series.time.frombytes(np.ascontiguousarray(time, dtype=np.int64).tobytes())
+        return series
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, k: Union[int, slice]) -> Union[Pivot, List[Pivot]]:
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(len(self.index)))]
+        return Pivot(self.index[k], self.price[k], "H" if self.kind[k] > 0 else "L", self.time[k])
+
+    def __iter__(self) -> Iterator[Pivot]:
+        for i in range(len(self.index)):
+            yield self[i]
+
+    def append(self, index: int, price: float, kind: str, epoch: int) -> None:
+        self.index.append(index)
+        self.price.append(price)
+        self.kind.append(1 if kind == "H" else -1)
+        self.time.append(epoch)
+
+    def set_last(self, index: int, price: float, kind: str, epoch: int) -> None:
+        self.index[-1] = index
+        self.price[-1] = price
+        self.kind[-1] = 1 if kind == "H" else -1
+        self.time[-1] = epoch
+
+    def truncate(self, size: int) -> None:
+        for col in (self.index, self.price, self.kind, self.time):
+            del col[size:]
+
+    def to_arrays(self) -> "ZigZagArrays":
+        """Copy into NumPy columns."""
+        return ZigZagArrays(
+            index=np.array(self.index, dtype=np.int64),
+            price=np.array(self.price, dtype=np.float64),
+            kind=np.array(self.kind, dtype=np.int8),
+            time=np.array(self.time, dtype=np.int64),
+        )
+
+
+@dataclass
+class ZigZagArrays:
+    """Pivots as compact parallel arrays, as returned by ``zigzag_numpy``."""
+    index: np.ndarray  # int64 bar position
+    price: np.ndarray  # float64
+    kind: np.ndarray  # int8: +1 = 'H', -1 = 'L'
+    time: np.ndarray  # int64 epoch seconds
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def to_pivots(self) -> PivotSeries:
+        """As a ``PivotSeries`` (no per-pivot objects until accessed)."""
+        return PivotSeries.from_arrays(self.index, self.price, self.kind, self.time)
+
+
+def _candidate(high: float, low: float, peak: bool, valley: bool) -> Optional[Tuple[str, float]]:
+    """Pick the pivot candidate (kind, price) for a bar from its peak/valley flags."""
+    if peak and not valley:
+        return "H", high
+    if valley and not peak:
+        return "L", low
+    if peak and valley:
+        # Rare equal-high/low case: pick by range; prefer higher move
+        if (high - low) >= abs(high - low):
+            return "H", high
+        return "L", low
+    return None
+
+
+def _extreme_flags(values: List[float], depth: int, highest: bool) -> List[bool]:
+    """
+    Flag bars that are the max (or min) of their centered ``[i-depth, i+depth]``
+    window, for ``i`` in ``[depth, n-depth)``.
+
+    Single O(n) sweep with a monotonic deque of candidate indices.
+    """
+    flags: List[bool] = []
+    window: Deque[int] = deque()
+    span = 2 * depth
+    for j, v in enumerate(values):
+        if highest:
+            while window and values[window[-1]] <= v:
+                window.pop()
+        else:
+            while window and values[window[-1]] >= v:
+                window.pop()
+        window.append(j)
+        if j >= span:
+            if window[0] < j - span:
+                window.popleft()
+            flags.append(values[j - depth] == values[window[0]])
+    return flags
+
+
+class _PivotTracker:
+    """
+    Sequential Deviation/Backstep filter shared by the batch and incremental engines.
+
+    Candidates must be pushed in bar order; ``pivots[-1]`` may still be replaced
+    by a more extreme same-kind candidate within ``backstep`` bars.
+    """
+
+    __slots__ = ("backstep", "min_move", "pivots", "last_kind", "last_price", "last_index")
+
+    def __init__(self, backstep: int, min_move: float) -> None:
+        self.backstep = backstep
+        self.min_move = min_move
+        self.pivots = PivotSeries()
+        self.last_kind: Optional[str] = None
+        self.last_price: Optional[float] = None
+        self.last_index: Optional[int] = None
+
+    def push(self, i: int, kind: str, price: float, time_of: Callable[[int], int]) -> None:
+        # If no previous pivot, accept first
+        if self.last_kind is None:
+            self.pivots.append(i, price, kind, time_of(i))
+            self.last_kind, self.last_price, self.last_index = kind, price, i
+            return
+
+        # Same-kind within backstep → keep only more extreme pivot
+        if kind == self.last_kind and self.last_index is not None and (i - self.last_index) <= self.backstep:
+            replace = (
+                (kind == "H" and price > (self.last_price or -1)) or
+                (kind == "L" and price < (self.last_price or 1e99))
+            )
+            if replace and self.pivots:
+                self.pivots.set_last(i, price, kind, time_of(i))
+                self.last_price, self.last_index = price, i
+            return
+
+        # Opposite-kind pivot → require deviation (in points)
+        # e.g., switch from H to L requires |last_price - candidate_price| >= deviation_points * point
+        if self.last_price is not None and abs(price - self.last_price) < self.min_move:
+            # Not enough move to declare reversal
+            return
+
+        self.pivots.append(i, price, kind, time_of(i))
+        self.last_kind, self.last_price, self.last_index = kind, price, i
+
+    def snapshot(self) -> Tuple[int, Optional[Pivot], Optional[str], Optional[float], Optional[int]]:
+        tail = self.pivots[-1] if self.pivots else None
+        return len(self.pivots), tail, self.last_kind, self.last_price, self.last_index
+
+    def restore(self, snap: Tuple[int, Optional[Pivot], Optional[str], Optional[float], Optional[int]]) -> None:
+        size, tail, self.last_kind, self.last_price, self.last_index = snap
+        self.pivots.truncate(size)
+        if tail is not None:
+            self.pivots.set_last(tail.index, tail.price, tail.kind, tail.epoch)
 
 
 def zigzag_classic(
     highs: Iterable[float],
     lows: Iterable[float],
-    times: Iterable[pd.Timestamp],
+    times: Iterable[Any],
     depth: int,
     deviation_points: float,
     backstep: int,
     point: float,
-) -> List[Pivot]:
+) -> PivotSeries:
     """
     Compute ZigZag pivots using the classic Depth/Deviation/Backstep approach.
 
@@ -41,77 +269,219 @@ def zigzag_classic(
         - backstep: ถ้ามี pivot ชนิดเดียวกันเกิดใกล้กัน ให้เก็บเฉพาะตัวที่ "สุดขั้วกว่า" (แทนที่)
 
     Returns:
-        List[Pivot]: pivots in chronological order.
+        PivotSeries: pivots in chronological order.
     """
     highs = list(highs)
     lows = list(lows)
-    times = list(times)
+    epochs = _epochs(times).tolist()
     n = len(highs)
 
     if n < (2 * depth + 1):
-        return []
+        return PivotSeries()
 
-    def is_peak(i: int) -> bool:
-        window = highs[i - depth: i + depth + 1]
-        return highs[i] == max(window)
+    peaks = _extreme_flags(highs, depth, highest=True)
+    valleys = _extreme_flags(lows, depth, highest=False)
 
-    def is_valley(i: int) -> bool:
-        window = lows[i - depth: i + depth + 1]
-        return lows[i] == min(window)
-
-    pivots: List[Pivot] = []
-    last_kind: Optional[str] = None
-    last_price: Optional[float] = None
-    last_index: Optional[int] = None
+    tracker = _PivotTracker(backstep, deviation_points * point)
 
     for i in range(depth, n - depth):
-        peak = is_peak(i)
-        valley = is_valley(i)
-
-        # Decide pivot candidate
-        if peak and not valley:
-            candidate_kind = "H"
-            candidate_price = highs[i]
-        elif valley and not peak:
-            candidate_kind = "L"
-            candidate_price = lows[i]
-        elif peak and valley:
-            # Rare equal-high/low case: pick by range; prefer higher move
-            if (highs[i] - lows[i]) >= (abs(candidate := highs[i] - lows[i])):
-                candidate_kind = "H"
-                candidate_price = highs[i]
-            else:
-                candidate_kind = "L"
-                candidate_price = lows[i]
-        else:
-            continue
+        cand = _candidate(highs[i], lows[i], peaks[i - depth], valleys[i - depth])
+        if cand is not None:
+            tracker.push(i, cand[0], cand[1], epochs.__getitem__)
 
-        # If no previous pivot, accept first
-        if last_kind is None:
-            pivots.append(Pivot(i, candidate_price, candidate_kind, times[i].to_pydatetime()))
-            last_kind, last_price, last_index = candidate_kind, candidate_price, i
+    # Pushed in bar order, so already chronological
+    return tracker.pivots
+
+
+class IncrementalZigZag:
+    """
+    Streaming ZigZag engine that yields the same pivots as ``zigzag_classic``
+    over the full history it has been fed.
+
+    Bar ``i`` becomes decidable once bar ``i + depth`` exists, so each new bar
+    evaluates exactly one index over the last ``2 * depth + 1`` bars.  Revising
+    the newest (still-forming) bar rewinds and re-evaluates that same index, so
+    per-update work is O(depth) regardless of history length.
+
+    Pivot indices count bars from the first bar fed to this instance. Bar
+    times may be epoch seconds or datetimes; they are kept as epoch seconds.
+    """
+
+    def __init__(self, depth: int, deviation_points: float, backstep: int, point: float) -> None:
+        self.depth = depth
+        self._tracker = _PivotTracker(backstep, deviation_points * point)
+        size = 2 * depth + 1
+        self._highs: Deque[float] = deque(maxlen=size)
+        self._lows: Deque[float] = deque(maxlen=size)
+        self._times: Deque[int] = deque(maxlen=size)
+        self._count = 0
+        # Tracker state before the most recently evaluated index
+        self._snapshot: Optional[Tuple[int, Optional[Pivot], Optional[str], Optional[float], Optional[int]]] = None
+
+    @property
+    def pivots(self) -> PivotSeries:
+        """Pivots so far; the last one may still move while it is within backstep."""
+        return self._tracker.pivots
+
+    @property
+    def bar_count(self) -> int:
+        return self._count
+
+    @property
+    def last_time(self) -> Optional[int]:
+        """Epoch seconds of the newest bar."""
+        return self._times[-1] if self._count else None
+
+    def update(self, high: float, low: float, time: Any) -> None:
+        """
+        Apply one bar: append it if newer than the last bar, or revise the last
+        bar in place if it carries the same timestamp.
+        """
+        if type(time) is not int:
+            time = _epoch(time)
+        if self._count and time == self._times[-1]:
+            self._highs[-1] = high
+            self._lows[-1] = low
+            if self._snapshot is not None:
+                self._tracker.restore(self._snapshot)
+                self._evaluate()
+            return
+        if self._count and time < self._times[-1]:
+            raise ValueError(f"Bar at {time} is older than last bar {self._times[-1]}")
+
+        self._highs.append(high)
+        self._lows.append(low)
+        self._times.append(time)
+        self._count += 1
+        if self._count >= 2 * self.depth + 1:
+            self._snapshot = self._tracker.snapshot()
+            self._evaluate()
+
+    def feed(self, highs: Sequence[float], lows: Sequence[float], times: Sequence[Any]) -> int:
+        """
+        Consume a chronological batch (e.g. the latest ``get_rates`` frame),
+        skipping bars already seen. Only the tail at or after the last known
+        timestamp is touched. Returns the number of bars applied.
+        """
+        epochs = _epochs(times)
+        n = len(epochs)
+        # First bar at or after the last known one (a revision of it, or new)
+        start = int(np.searchsorted(epochs, self._times[-1])) if self._count else 0
+        for high, low, t in zip(
+            np.asarray(highs, dtype=np.float64)[start:].tolist(),
+            np.asarray(lows, dtype=np.float64)[start:].tolist(),
+            epochs[start:].tolist(),
+        ):
+            self.update(high, low, t)
+        return n - start
+
+    def _evaluate(self) -> None:
+        d = self.depth
+        high, low = self._highs[d], self._lows[d]
+        cand = _candidate(high, low, high == max(self._highs), low == min(self._lows))
+        if cand is not None:
+            center = self._times[d]
+            self._tracker.push(self._count - 1 - d, cand[0], cand[1], lambda _i: center)
+
+
+# (depth, deviation_points, backstep)
+ZigZagParams = Tuple[int, float, int]
+
+
+def _sparse_table(values: np.ndarray, max_width: int, reduce: Callable[..., np.ndarray]) -> List[np.ndarray]:
+    """``levels[k][i] = reduce(values[i:i + 2**k])`` for every ``2**k <= max_width``."""
+    levels = [values]
+    span = 1
+    while 2 * span <= max_width:
+        prev = levels[-1]
+        levels.append(reduce(prev[:-span], prev[span:]))
+        span *= 2
+    return levels
+
+
+def _window_extreme(levels: List[np.ndarray], width: int, reduce: Callable[..., np.ndarray]) -> np.ndarray:
+    """``reduce`` over every ``width``-bar window, from two overlapping power-of-two blocks."""
+    k = width.bit_length() - 1
+    level = levels[k]
+    count = len(levels[0]) - width + 1
+    shift = width - (1 << k)
+    return reduce(level[:count], level[shift:shift + count])
+
+
+def zigzag_multi(
+    rates: np.ndarray,
+    params: Sequence[ZigZagParams],
+    point: float,
+) -> List[ZigZagArrays]:
+    """
+    ``zigzag_numpy`` for several (depth, deviation_points, backstep) sets over
+    the same bars, in the order given.
+
+    Window highs/lows come from one sparse table (power-of-two block extrema)
+    built up to the largest depth, so each extra depth costs one O(n) pass;
+    peak/valley candidates are computed once per distinct depth and only the
+    Deviation/Backstep filter runs per parameter set.
+    """
+    highs = rates["high"]
+    lows = rates["low"]
+    n = len(rates)
+    fit = [d for d, _, _ in params if n >= 2 * d + 1]
+    if fit:
+        max_width = 2 * max(fit) + 1
+        high_levels = _sparse_table(highs, max_width, np.maximum)
+        low_levels = _sparse_table(lows, max_width, np.minimum)
+
+    candidates: Dict[int, Tuple[List[Any], ...]] = {}
+    results: List[ZigZagArrays] = []
+    for depth, deviation_points, backstep in params:
+        if n < (2 * depth + 1):
+            empty = np.empty(0, dtype=np.int64)
+            results.append(ZigZagArrays(empty, np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int8), empty.copy()))
             continue
 
-        # Same-kind within backstep → keep only more extreme pivot
-        if candidate_kind == last_kind and last_index is not None and (i - last_index) <= backstep:
-            replace = (
-                (candidate_kind == "H" and candidate_price > (last_price or -1)) or
-                (candidate_kind == "L" and candidate_price < (last_price or 1e99))
+        if depth not in candidates:
+            width = 2 * depth + 1
+            inner_highs = highs[depth:n - depth]
+            inner_lows = lows[depth:n - depth]
+            peaks = inner_highs == _window_extreme(high_levels, width, np.maximum)
+            valleys = inner_lows == _window_extreme(low_levels, width, np.minimum)
+            cand = np.flatnonzero(peaks | valleys)
+            candidates[depth] = (
+                (cand + depth).tolist(),
+                peaks[cand].tolist(),
+                valleys[cand].tolist(),
+                inner_highs[cand].tolist(),
+                inner_lows[cand].tolist(),
             )
-            if replace and pivots:
-                pivots[-1] = Pivot(i, candidate_price, candidate_kind, times[i].to_pydatetime())
-                last_price, last_index = candidate_price, i
-            continue
 
-        # Opposite-kind pivot → require deviation (in points)
-        # e.g., switch from H to L requires |last_price - candidate_price| >= deviation_points * point
-        if last_price is not None and abs(candidate_price - last_price) < deviation_points * point:
-            # Not enough move to declare reversal
-            continue
+        tracker = _PivotTracker(backstep, deviation_points * point)
+        # Times are gathered from the array afterwards, so the tracker only carries indices
+        no_time: Callable[[int], int] = lambda _i: 0
+        for i, peak, valley, high, low in zip(*candidates[depth]):
+            kind_price = _candidate(high, low, peak, valley)
+            if kind_price is not None:
+                tracker.push(i, kind_price[0], kind_price[1], no_time)
+
+        arrays = tracker.pivots.to_arrays()
+        arrays.time = rates["time"][arrays.index].astype(np.int64)
+        results.append(arrays)
+    return results
 
-        pivots.append(Pivot(i, candidate_price, candidate_kind, times[i].to_pydatetime()))
-        last_kind, last_price, last_index = candidate_kind, candidate_price, i
 
-    # Ensure chronological sort
-    pivots.sort(key=lambda p: p.index)
-    return pivots
+def zigzag_numpy(
+    rates: np.ndarray,
+    depth: int,
+    deviation_points: float,
+    backstep: int,
+    point: float,
+) -> ZigZagArrays:
+    """
+    Vectorized ZigZag over a raw MT5 rates record array (``high``/``low``/``time``
+    fields as returned by ``copy_rates_from_pos``), without DataFrame or list
+    conversion of the bars.
+
+    Peak/valley flags are computed with NumPy window extrema; only the sparse
+    candidate bars go through the Deviation/Backstep filter, which is shared
+    with ``zigzag_classic`` so pivots are identical.
+    """
+    return zigzag_multi(rates, [(depth, deviation_points, backstep)], point)[0]
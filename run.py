@@ -18,11 +18,20 @@ PEP8-compliant พร้อม docstrings และคอมเมนต์
 
 import logging
 import time
-from typing import Dict, Any
 
-from core.config.config import load_config, parse_cli
-from core.mt5.connection import init_mt5_with_login, select_symbol, shutdown_mt5, timeframe_to_mt5
-from core.orchestrator import process_once
+from core import metrics
+from core.config.config import ConfigWatcher, load_config, parse_cli
+from core.mt5.connection import (
+    init_mt5_with_login,
+    select_symbols,
+    set_data_source,
+    set_history_dir,
+    set_resampling,
+    shutdown_mt5,
+)
+from core.mt5.source import create_source
+from core.scheduler import Scheduler
+from core.webhook.sender import WebhookDispatcher
 
 
 def main() -> None:
@@ -35,31 +44,71 @@ def main() -> None:
         format="%(asctime)s | %(levelname)-8s | %(message)s",
     )
 
-    logging.info("Starting ZigZag Classic Watcher")
-    logging.info("Symbol=%s | TF=%s | ZigZag(depth=%d, dev=%s pts, backstep=%d)",
-                 cfg.symbol, cfg.timeframe, cfg.zz_depth, cfg.zz_deviation_points, cfg.zz_backstep)
+    logging.info("Starting ZigZag Classic Watcher (%d watches)", len(cfg.watches))
+    for w in cfg.watches:
+        logging.info("Symbol=%s | TF=%s | ZigZag(depth=%d, dev=%s pts, backstep=%d)",
+                     w.symbol, w.timeframe, w.zz_depth, w.zz_deviation_points, w.zz_backstep)
 
-    # Connect MT5
-    init_mt5_with_login(cfg.mt5_login, cfg.mt5_password, cfg.mt5_server)
+    if cfg.metrics_enabled:
+        metrics.enable(cfg.metrics_port, cfg.metrics_host, cfg.metrics_log_interval_sec)
 
-    # Ensure symbol selected
-    if not select_symbol(cfg.symbol):
-        raise RuntimeError(f"Cannot select symbol {cfg.symbol}")
+    # Connect MT5 (one session shared by all watches)
+    set_data_source(create_source(cfg.data_source, **cfg.data_source_options))
+    session = init_mt5_with_login(
+        cfg.mt5_login, cfg.mt5_password, cfg.mt5_server,
+        backoff_sec=cfg.mt5_reconnect_backoff_sec,
+        backoff_max_sec=cfg.mt5_reconnect_backoff_max_sec,
+        health_check_sec=cfg.mt5_health_check_sec,
+    )
+    set_history_dir(cfg.history_dir)
+    if cfg.resample_timeframes:
+        logging.info("Building %s from M1 bars", ", ".join(cfg.resample_timeframes))
+        set_resampling(cfg.resample_timeframes, cfg.resample_max_age_sec)
+
+    # Ensure symbols selected
+    failed = select_symbols(sorted({w.symbol for w in cfg.watches}))
+    if failed:
+        raise RuntimeError(f"Cannot select symbol(s) {', '.join(failed)}")
 
-    tf_const = timeframe_to_mt5(cfg.timeframe)
+    dispatcher = WebhookDispatcher(
+        destinations=cfg.webhooks,
+        max_queue=cfg.webhook_queue_size,
+        max_retries=cfg.webhook_max_retries,
+        backoff_sec=cfg.webhook_backoff_sec,
+        backoff_max_sec=cfg.webhook_backoff_max_sec,
+        timeout_sec=cfg.webhook_timeout_sec,
+        spool_dir=cfg.webhook_spool_dir,
+        spool_rescan_sec=cfg.webhook_spool_rescan_sec,
+    )
+    dispatcher.start()
 
-    state: Dict[str, Any] = {}
+    scheduler = Scheduler(cfg, dispatcher)
+    watcher = ConfigWatcher(args.config, cfg.reload_interval_sec) if cfg.reload_interval_sec > 0 else None
     try:
         while True:
-            try:
-                process_once(cfg, tf_const, state)
-            except Exception as exc:  # pragma: no cover - runtime robustness
-                logging.exception("Error in process_once: %s", exc)
-            time.sleep(cfg.poll_interval_sec)
+            if not session.ensure():
+                # Terminal down: nothing to poll until the next reconnect attempt
+                time.sleep(max(0.1, session.seconds_until_retry()))
+                continue
+            if watcher is not None:
+                reloaded = watcher.poll()
+                if reloaded is not None:
+                    try:
+                        scheduler.apply_config(reloaded)
+                    except Exception as exc:  # pragma: no cover - runtime robustness
+                        logging.exception("Config reload failed, keeping the running config: %s", exc)
+            scheduler.run_due()
+            sleep = scheduler.seconds_until_next()
+            if watcher is not None:
+                sleep = min(sleep, cfg.reload_interval_sec)
+            time.sleep(sleep)
     except KeyboardInterrupt:
         logging.info("Interrupted by user.")
     finally:
+        dispatcher.stop()
+        scheduler.close()
         shutdown_mt5()
+        metrics.disable()
 
 
 if __name__ == "__main__":
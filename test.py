@@ -15,9 +15,10 @@ import pandas as pd
 from typing import List, Tuple
 
 from core.config.config import load_config
-from core.mt5.connection import init_mt5_with_login, select_symbol, shutdown_mt5, timeframe_to_mt5, get_rates, get_symbol_info
+from core.mt5.connection import init_mt5_with_login, select_symbol, set_data_source, set_history_dir, shutdown_mt5, timeframe_to_mt5, get_rates, get_symbol_info
+from core.mt5.source import create_source
 from core.zigzag.calculator import zigzag_classic, Pivot
-from core.patterns.detector import PatternBuffer, classify_pivots_hhhl
+from core.patterns.detector import replay
 
 
 def parse_args():
@@ -38,32 +39,13 @@ def setup_logging():
 def detect_patterns(pivots: List[Pivot], patterns: List[List[str]]) -> List[Tuple[int, List[str]]]:
     """
     Detect patterns in the pivots and return the indices where patterns are found.
-    
+
+    Streams the pivots once through the same matcher path as live detection.
+
     Returns:
         List of tuples (pivot_index, pattern) where patterns were detected
     """
-    if not pivots:
-        return []
-    
-    labels = classify_pivots_hhhl(pivots)
-    buf = PatternBuffer(maxlen=10)
-    buf.extend(labels)
-    
-    detected_patterns = []
-    
-    # For visualization purposes, we'll simulate the pattern detection process
-    # by checking at each pivot point
-    for i in range(len(labels)):
-        current_labels = labels[:i+1]
-        current_buf = PatternBuffer(maxlen=10)
-        current_buf.extend(current_labels)
-        
-        for pattern in patterns:
-            if current_buf.ends_with(pattern) and i >= len(pattern) - 1:
-                # Pattern detected at this pivot
-                detected_patterns.append((pivots[i].index, pattern))
-    
-    return detected_patterns
+    return list(replay(pivots, patterns))
 
 
 def plot_chart_with_zigzag(
@@ -154,7 +136,9 @@ def main():
     
     # Connect to MT5
     try:
+        set_data_source(create_source(cfg.data_source, **cfg.data_source_options))
         init_mt5_with_login(cfg.mt5_login, cfg.mt5_password, cfg.mt5_server)
+        set_history_dir(cfg.history_dir)
         
         # Ensure symbol is selected
         if not select_symbol(cfg.symbol):